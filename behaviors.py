@@ -1,5 +1,5 @@
 import math
-from utils import distance, normalize, angle_between
+from utils import distance, distance_sq, normalize, angle_between
 import random
 from config import ResourceConfig
 
@@ -120,10 +120,10 @@ class MoveBehavior(Behavior):
             return True
         
         # Consider finished if very close and nearly stopped
-        dist = distance(self.unit.position, self.target_position)
+        dist_sq = distance_sq(self.unit.position, self.target_position)
         low_velocity = abs(self.unit.velocity[0]) < 2 and abs(self.unit.velocity[1]) < 2
         
-        return dist < self.arrival_threshold * 0.5 and low_velocity
+        return dist_sq < (self.arrival_threshold * 0.5) ** 2 and low_velocity
 
 class GatherBehavior(Behavior):
     """Behavior for gathering resources using physics-based movement."""
@@ -190,9 +190,9 @@ class GatherBehavior(Behavior):
         target_position = self.resource.get_slot_position(self.slot_index)
         
         # Move toward the slot position
-        dist = distance(self.unit.position, target_position)
+        dist_sq = distance_sq(self.unit.position, target_position)
         
-        if dist < self.arrival_threshold:
+        if dist_sq < self.arrival_threshold * self.arrival_threshold:
             # We've arrived, slow down
             self.unit.velocity[0] *= 0.7
             self.unit.velocity[1] *= 0.7
@@ -353,7 +353,7 @@ class GatherBehavior(Behavior):
         if command_centers:
             # Return closest one
             return min(command_centers, 
-                     key=lambda cc: distance(self.unit.position, cc.position))
+                     key=lambda cc: distance_sq(self.unit.position, cc.position))
         return None
     
     def _find_new_resource(self):
@@ -368,7 +368,7 @@ class GatherBehavior(Behavior):
         if resources:
             # Return closest one
             return min(resources, 
-                     key=lambda r: distance(self.unit.position, r.position))
+                     key=lambda r: distance_sq(self.unit.position, r.position))
         return None
     
     def _move_toward_target(self, target_position, dt):
@@ -413,17 +413,17 @@ class AttackBehavior(Behavior):
                 self.unit.attack_cooldown -= dt
             
             # Calculate distance to target
-            dist = distance(self.unit.position, self.target.position)
+            dist_sq = distance_sq(self.unit.position, self.target.position)
             
             # If target moved out of chase range, stop attacking
-            if dist > self.chase_range:
+            if dist_sq > self.chase_range * self.chase_range:
                 return True
             
             # Handle movement based on attack type
             if self.is_melee:
                 # Melee units need to get close to the target
                 # When in range, they'll deal damage through collision in _handle_collisions
-                if dist > self.unit.size:  # Need to be touching target
+                if dist_sq > self.unit.size * self.unit.size:  # Need to be touching target
                     # Apply force toward target
                     self._move_toward_target(dt)
                     self.in_range = False
@@ -434,7 +434,7 @@ class AttackBehavior(Behavior):
                     self.in_range = True
             else:
                 # Ranged units should maintain distance
-                if dist > self.unit.attack_range:
+                if dist_sq > self.unit.attack_range * self.unit.attack_range:
                     # Move toward target
                     self._move_toward_target(dt)
                     self.in_range = False
@@ -543,8 +543,7 @@ class HoldPositionBehavior(Behavior):
         self.unit.velocity[1] *= 0.9
         
         # Check if we've drifted too far from hold position
-        dist_from_hold = distance(self.unit.position, self.hold_position)
-        if dist_from_hold > self.position_threshold:
+        if distance_sq(self.unit.position, self.hold_position) > self.position_threshold * self.position_threshold:
             # Apply force to move back to hold position
             self._return_to_position(dt)
         
@@ -557,7 +556,7 @@ class HoldPositionBehavior(Behavior):
             if self.attacking_target:
                 if (not hasattr(self.attacking_target, 'health') or 
                     self.attacking_target.health <= 0 or
-                    distance(self.unit.position, self.attacking_target.position) > self.unit.aggro_range):
+                    distance_sq(self.unit.position, self.attacking_target.position) > self.unit.aggro_range * self.unit.aggro_range):
                     self.attacking_target = None
             
             # If no target, look for a new one
@@ -605,7 +604,7 @@ class HoldPositionBehavior(Behavior):
     
     def _return_to_position(self, dt):
         """Return to original hold position if pushed away."""
-        if distance(self.unit.position, self.hold_position) > self.position_threshold:
+        if distance_sq(self.unit.position, self.hold_position) > self.position_threshold * self.position_threshold:
             # Use standardized movement to return to position
             self._standardized_move_toward(self.hold_position, dt, force_scale=self.unit.steering_force * 0.3)
     
@@ -639,12 +638,12 @@ class HoldPositionBehavior(Behavior):
         # Look for enemies in aggro range
         enemies = []
         for entity in Game.instance.entities:
-            if (hasattr(entity, 'player_id') and entity.player_id != self.unit.player_id and
+            if (entity.player_id != self.unit.player_id and
                 hasattr(entity, 'health') and entity.health > 0):
                 
-                dist = distance(self.unit.position, entity.position)
-                if dist <= self.unit.aggro_range:
-                    enemies.append((entity, dist))
+                dist_sq = distance_sq(self.unit.position, entity.position)
+                if dist_sq <= self.unit.aggro_range * self.unit.aggro_range:
+                    enemies.append((entity, dist_sq))
         
         # Sort by distance
         if enemies:
@@ -693,7 +692,7 @@ class AttackMoveBehavior(Behavior):
     
     def update(self, dt):
         # Check if we've arrived at the destination
-        if distance(self.unit.position, self.target_position) < self.arrival_threshold:
+        if distance_sq(self.unit.position, self.target_position) < self.arrival_threshold * self.arrival_threshold:
             # Slow down as we approach
             self.unit.velocity[0] *= 0.8
             self.unit.velocity[1] *= 0.8
@@ -711,7 +710,7 @@ class AttackMoveBehavior(Behavior):
             if self.attacking_target:
                 if (not hasattr(self.attacking_target, 'health') or 
                     self.attacking_target.health <= 0 or
-                    distance(self.unit.position, self.attacking_target.position) > self.unit.aggro_range):
+                    distance_sq(self.unit.position, self.attacking_target.position) > self.unit.aggro_range * self.unit.aggro_range):
                     self.attacking_target = None
             
             # If no target, check for new enemies
@@ -724,11 +723,11 @@ class AttackMoveBehavior(Behavior):
             if self.unit.attack_cooldown > 0:
                 self.unit.attack_cooldown -= dt
             
-            target_dist = distance(self.unit.position, self.attacking_target.position)
+            target_dist_sq = distance_sq(self.unit.position, self.attacking_target.position)
             
             if self.is_melee:
                 # For melee units, move toward target
-                if target_dist > self.unit.size:
+                if target_dist_sq > self.unit.size * self.unit.size:
                     self._move_toward_target(self.attacking_target.position, dt)
                 else:
                     # In melee range, slow down
@@ -740,7 +739,7 @@ class AttackMoveBehavior(Behavior):
                         self._apply_melee_damage(self.attacking_target)
             else:
                 # For ranged units
-                if target_dist <= self.unit.attack_range:
+                if target_dist_sq <= self.unit.attack_range * self.unit.attack_range:
                     # In range for attack, slow down
                     self.unit.velocity[0] *= 0.9
                     self.unit.velocity[1] *= 0.9
@@ -778,12 +777,12 @@ class AttackMoveBehavior(Behavior):
         # Look for enemies in aggro range
         enemies = []
         for entity in Game.instance.entities:
-            if (hasattr(entity, 'player_id') and entity.player_id != self.unit.player_id and
+            if (entity.player_id != self.unit.player_id and
                 hasattr(entity, 'health') and entity.health > 0):
                 
-                dist = distance(self.unit.position, entity.position)
-                if dist <= self.unit.aggro_range:
-                    enemies.append((entity, dist))
+                dist_sq = distance_sq(self.unit.position, entity.position)
+                if dist_sq <= self.unit.aggro_range * self.unit.aggro_range:
+                    enemies.append((entity, dist_sq))
         
         # Sort by distance
         if enemies:
@@ -813,7 +812,7 @@ class AttackMoveBehavior(Behavior):
     def is_finished(self):
         """Check if we've arrived at destination with no enemies."""
         # If we've reached the target position and aren't attacking anything
-        if distance(self.unit.position, self.target_position) < self.arrival_threshold and not self.attacking_target:
+        if distance_sq(self.unit.position, self.target_position) < self.arrival_threshold * self.arrival_threshold and not self.attacking_target:
             return True
         return False
 
@@ -852,11 +851,11 @@ class PatrolBehavior(Behavior):
                     self._move_toward_target(self.attacking_target.position, dt)
                     
                     # Deal damage if close enough
-                    if distance(self.unit.position, self.attacking_target.position) <= self.unit.size and self.unit.attack_cooldown <= 0:
+                    if distance_sq(self.unit.position, self.attacking_target.position) <= self.unit.size * self.unit.size and self.unit.attack_cooldown <= 0:
                         self._apply_melee_damage(self.attacking_target)
                 else:
                     # For ranged units
-                    if distance(self.unit.position, self.attacking_target.position) <= self.unit.attack_range:
+                    if distance_sq(self.unit.position, self.attacking_target.position) <= self.unit.attack_range * self.unit.attack_range:
                         # In range, slow down and attack
                         self.unit.velocity[0] *= 0.9
                         self.unit.velocity[1] *= 0.9
@@ -879,7 +878,7 @@ class PatrolBehavior(Behavior):
                 # Check if target is dead or out of range
                 if (not hasattr(self.attacking_target, 'health') or 
                     self.attacking_target.health <= 0 or
-                    distance(self.unit.position, self.attacking_target.position) > self.chase_range):
+                    distance_sq(self.unit.position, self.attacking_target.position) > self.chase_range * self.chase_range):
                     # Go back to patrolling
                     self.attacking_target = None
                 
@@ -889,10 +888,10 @@ class PatrolBehavior(Behavior):
         
         # If no enemies, continue patrolling
         # Calculate distance to current target
-        dist = distance(self.unit.position, self.current_target)
+        dist_sq = distance_sq(self.unit.position, self.current_target)
         
         # If reached current target, switch direction
-        if dist < self.arrival_threshold:
+        if dist_sq < self.arrival_threshold * self.arrival_threshold:
             # Slow down as we reach the patrol point
             self.unit.velocity[0] *= 0.7
             self.unit.velocity[1] *= 0.7
@@ -921,19 +920,19 @@ class PatrolBehavior(Behavior):
         
         # Look for enemies in aggro range
         enemies = [e for e in Game.instance.entities 
-                   if hasattr(e, 'player_id') and e.player_id != self.unit.player_id
+                   if e.player_id != self.unit.player_id
                    and hasattr(e, 'health') and e.health > 0]
         
         # Find closest enemy in aggro range
         enemies_in_range = []
         for enemy in enemies:
-            if distance(self.unit.position, enemy.position) <= self.unit.aggro_range:
+            if distance_sq(self.unit.position, enemy.position) <= self.unit.aggro_range * self.unit.aggro_range:
                 enemies_in_range.append(enemy)
         
         if enemies_in_range:
             # Target closest enemy
             return min(enemies_in_range, 
-                     key=lambda e: distance(self.unit.position, e.position))
+                     key=lambda e: distance_sq(self.unit.position, e.position))
         
         return None
     
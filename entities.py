@@ -1,8 +1,8 @@
 import pygame
 import math
 import random
-from utils import distance, angle_between, normalize, create_square, create_triangle
-from utils import WHITE, RED, GREEN, BLUE, YELLOW, CYAN
+from utils import distance_sq, angle_between, normalize, create_square, create_triangle
+from utils import WHITE, RED, GREEN, BLUE, YELLOW, CYAN, UNIT_HEXAGON
 from behaviors import IdleBehavior, MoveBehavior, GatherBehavior, AttackBehavior, HoldPositionBehavior, AttackMoveBehavior, PatrolBehavior
 from typing import List, Tuple, Optional, Union, Dict, Any
 from config import UnitConfig, BuildingConfig, ResourceConfig, MovementConfig
@@ -16,11 +16,15 @@ def get_game_instance():
 class Entity:
     """Base class for all game entities."""
     
+    Z_ORDER = 0  # Stacking priority for hit-testing, higher is on top
+    renderable = True  # Drawn by the world renderer
+    
     def __init__(self, position, size, color=WHITE):
         self.position = list(position)
         self.size = size
         self.color = color
         self.selected = False
+        self.player_id = None  # Owning player, None for neutral entities like resources
         self.rect = pygame.Rect(position[0] - size/2, position[1] - size/2, size, size)
         self.angle = 0  # Orientation in radians
         
@@ -96,12 +100,14 @@ class Entity:
     
     def contains_point(self, point):
         """Check if this entity contains the given point."""
-        return distance(self.position, point) <= self.size/2
+        return distance_sq(self.position, point) <= (self.size/2) ** 2
 
 
 class Resource(Entity):
     """Resource entity (minerals)."""
     
+    Z_ORDER = 0
+    
     def __init__(self, position, amount=500):
         super().__init__(position, 30, CYAN)
         self.amount = amount
@@ -232,6 +238,8 @@ class Resource(Entity):
 class Unit(Entity):
     """Base class for all units."""
     
+    Z_ORDER = 1
+    
     def __init__(self, position, size, color, max_health, speed, player_id=0):
         super().__init__(position, size, color)
         self.max_health = max_health
@@ -448,19 +456,19 @@ class Unit(Entity):
         
         # Look for enemies in aggro range
         enemies = [e for e in Game.instance.entities 
-                   if hasattr(e, 'player_id') and e.player_id != self.player_id
+                   if e.player_id != self.player_id
                    and hasattr(e, 'health') and e.health > 0]
         
         # Find closest enemy in aggro range
         enemies_in_range = []
         for enemy in enemies:
-            if distance(self.position, enemy.position) <= self.aggro_range:
+            if distance_sq(self.position, enemy.position) <= self.aggro_range * self.aggro_range:
                 enemies_in_range.append(enemy)
         
         if enemies_in_range:
             # Target closest enemy
             closest_enemy = min(enemies_in_range, 
-                               key=lambda e: distance(self.position, e.position))
+                               key=lambda e: distance_sq(self.position, e.position))
             
             # Attack the enemy
             self.attack(closest_enemy)
@@ -552,10 +560,16 @@ class Square(Unit):
         # Use the behavior system to handle gathering
         self.current_behavior = GatherBehavior(self, resource)
     
-    def render(self, renderer):
-        """Render the worker as a square."""
+    def render(self, renderer, points=None):
+        """Render the worker as a square.
+        
+        Args:
+            renderer: The renderer to draw with
+            points: Precomputed square vertices, if the caller built them in bulk
+        """
         # Calculate square points based on position and rotation
-        points = create_square(self.position, self.size, self.angle)
+        if points is None:
+            points = create_square(self.position, self.size, self.angle)
         
         # Draw the square
         renderer.draw_polygon(points, self.color, 0, True)
@@ -652,9 +666,10 @@ class Triangle(Unit):
         self.restitution = 0.05  # Almost no bounce
         self.target_reached_threshold = 45.0  # Very wide zone for ranged units
     
-    def render(self, renderer):
-        # Draw as a triangle
-        points = create_triangle(self.position, self.size, self.angle)
+    def render(self, renderer, points=None):
+        # Draw as a triangle, unless the caller built the vertices in bulk
+        if points is None:
+            points = create_triangle(self.position, self.size, self.angle)
         renderer.draw_polygon(points, self.color, 0, True)
         renderer.draw_polygon(points, WHITE, 1, False)
         
@@ -681,6 +696,12 @@ class Triangle(Unit):
 class Building(Entity):
     """Base class for all buildings."""
     
+    Z_ORDER = 2
+    
+    # Production cost and build time (seconds) by unit type name
+    _UNIT_COSTS = {"square": 50, "dot": 75, "triangle": 100}
+    _UNIT_BUILD_TIMES = {"square": 5, "dot": 6, "triangle": 7}
+    
     def __init__(self, position, size, color, max_health, player_id=0):
         super().__init__(position, size, color)
         self.max_health = max_health
@@ -757,13 +778,7 @@ class Building(Entity):
             # If it's a class type, convert to string name
             unit_type_name = unit_type.__name__.lower()
             
-        if unit_type_name == "square":
-            return 5
-        elif unit_type_name == "dot":
-            return 6
-        elif unit_type_name == "triangle":
-            return 7
-        return 5.0  # Default time if type not recognized
+        return self._UNIT_BUILD_TIMES.get(unit_type_name, 5.0)  # Default time if type not recognized
     
     def take_damage(self, amount):
         """Take damage and return True if destroyed."""
@@ -789,13 +804,7 @@ class Building(Entity):
             unit_type_name = unit_type.__name__.lower()
         
         # Calculate cost
-        cost = 0
-        if unit_type_name == "square":
-            cost = 50
-        elif unit_type_name == "dot":
-            cost = 75
-        elif unit_type_name == "triangle":
-            cost = 100
+        cost = self._UNIT_COSTS.get(unit_type_name, 0)
         
         if game_instance.resources[self.player_id] < cost:
             return False
@@ -841,20 +850,21 @@ class Building(Entity):
             renderer.draw_line(self.position, self.rally_point, WHITE, 1)
             renderer.draw_circle(self.rally_point, 5, WHITE, 1)
         
-        # Draw health bar
+        # Draw health bar (the red background is only visible once damaged)
         health_pct = self.health / self.max_health
         bar_width = self.size * 1.2
-        renderer.draw_rect(
-            pygame.Rect(
-                self.position[0] - bar_width/2,
-                self.position[1] - self.size/2 - 10,
-                bar_width,
-                5
-            ),
-            RED,
-            0,
-            True
-        )
+        if health_pct < 1.0:
+            renderer.draw_rect(
+                pygame.Rect(
+                    self.position[0] - bar_width/2,
+                    self.position[1] - self.size/2 - 10,
+                    bar_width,
+                    5
+                ),
+                RED,
+                0,
+                True
+            )
         renderer.draw_rect(
             pygame.Rect(
                 self.position[0] - bar_width/2,
@@ -1019,12 +1029,8 @@ class Turret(Building):
             if not hasattr(self.target, 'health') or self.target.health <= 0 or self.target not in game_instance.entities:
                 self.target = None
             else:
-                # Calculate distance to target
-                target_dist = math.sqrt((self.position[0] - self.target.position[0])**2 + 
-                                        (self.position[1] - self.target.position[1])**2)
-                
                 # If target moved out of range, stop tracking it
-                if target_dist > self.attack_range:
+                if distance_sq(self.position, self.target.position) > self.attack_range * self.attack_range:
                     self.target = None
                 # Attack if cooldown is ready
                 elif self.attack_cooldown <= 0:
@@ -1038,19 +1044,19 @@ class Turret(Building):
         
         # If no target, find closest enemy in range
         if not self.target:
-            closest_dist = float('inf')
+            closest_dist_sq = float('inf')
             closest_enemy = None
+            range_sq = self.attack_range * self.attack_range
             
             for entity in game_instance.entities:
                 # Check if entity is an enemy with health
-                if (hasattr(entity, 'player_id') and entity.player_id != self.player_id and 
+                if (entity.player_id != self.player_id and 
                     hasattr(entity, 'health') and entity.health > 0):
                     
-                    dist = math.sqrt((self.position[0] - entity.position[0])**2 + 
-                                     (self.position[1] - entity.position[1])**2)
+                    dist_sq = distance_sq(self.position, entity.position)
                     
-                    if dist <= self.attack_range and dist < closest_dist:
-                        closest_dist = dist
+                    if dist_sq <= range_sq and dist_sq < closest_dist_sq:
+                        closest_dist_sq = dist_sq
                         closest_enemy = entity
             
             self.target = closest_enemy
@@ -1063,12 +1069,8 @@ class Turret(Building):
     
     def render(self, renderer):
         # Draw turret base (hexagon)
-        points = []
-        for i in range(6):
-            angle = math.pi/3 * i
-            x = self.position[0] + math.cos(angle) * self.size/2
-            y = self.position[1] + math.sin(angle) * self.size/2
-            points.append((x, y))
+        x, y = self.position
+        points = [(x + ux * self.size, y + uy * self.size) for ux, uy in UNIT_HEXAGON]
         
         renderer.draw_polygon(points, self.color, 0, True)
         renderer.draw_polygon(points, WHITE, 2, False)
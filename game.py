@@ -2,10 +2,52 @@ import pygame
 import pygame.freetype as freetype
 import sys
 import random
-import math
-from utils import WHITE, BLACK, RED, BLUE, GREEN, YELLOW, CYAN, distance
+import functools
+from math import cos as _cos, sin as _sin, tau as _tau
+import numpy as np
+from utils import WHITE, BLACK, RED, BLUE, GREEN, YELLOW, CYAN, UNIT_SQUARE, UNIT_TRIANGLE, distance_sq, transform_polygons
 from entities import Entity, Resource, Unit, Square, Dot, Triangle, Building, CommandCenter, UnitBuilding, Turret
 import behaviors
+from spatial_hash import SpatialHash
+
+
+@functools.lru_cache(maxsize=64)
+def _formation_unit_offsets(num_units):
+    """Get the unit-circle (cos, sin) offsets for a circular formation of num_units."""
+    angles = np.linspace(0, _tau, num_units, endpoint=False)
+    cos_offsets = np.cos(angles)
+    sin_offsets = np.sin(angles)
+    # The arrays are shared between callers through the cache
+    cos_offsets.setflags(write=False)
+    sin_offsets.setflags(write=False)
+    return cos_offsets, sin_offsets
+
+
+# Selection bucket for each selectable player entity class
+_SELECTION_BUCKETS = {
+    Square: "worker",
+    Dot: "combat",
+    Triangle: "combat",
+    CommandCenter: "building",
+    UnitBuilding: "building",
+    Turret: "building",
+}
+
+# Production commands -> (building class that produces the unit, debug message)
+_PRODUCE_MAP = {
+    "square": (CommandCenter, "Producing a Square worker"),
+    "dot": (UnitBuilding, "Producing a Dot unit"),
+    "triangle": (UnitBuilding, "Producing a Triangle unit"),
+}
+
+# Command card layouts as (button id, col, row), shown for the first matching selection type
+_COMMAND_CARD_LAYOUTS = {
+    "worker": (("move", 0, 0), ("gather", 1, 0), ("build", 2, 0)),
+    "combat": (("attack", 0, 0), ("hold", 1, 0), ("patrol", 2, 0)),
+    "command_center": (("square", 0, 0),),
+    "unit_building": (("dot", 0, 0), ("triangle", 1, 0)),
+}
+
 
 class Game:
     """Main game class that manages the game state."""
@@ -24,12 +66,17 @@ class Game:
         self.world_width = 4000
         self.world_height = 3000
         
-        # Camera offset for scrolling
-        self.camera_offset = [0, 0]
+        # Camera offset for scrolling, replaced as a whole tuple when the camera moves
+        self.camera_offset = (0.0, 0.0)
         
         # Game state
         self.entities = []
+        self.spatial_hash = SpatialHash(cell_size=64)  # Grid index for hit-testing
         self.selected_entities = []
+        self._selected_by_type = {"worker": [], "combat": [], "building": []}  # Selected player entities by role
+        self._selected_ids = set()  # id() of each selected entity, for O(1) membership tests
+        self._selection_version = 0  # Bumped on every selection change
+        self._formation_cache = None  # (selection version, units, x offsets, y offsets)
         self.resources = [200, 200]  # Player and enemy resources
         self.unit_building_cost = 150  # Cost to build a unit building
         
@@ -37,6 +84,7 @@ class Game:
         self.selection_start = None
         self.selection_end = None
         self.is_selecting = False
+        self._mods_cache = 0  # Keyboard modifiers sampled for the current mouse event
         
         # Special command states
         self.build_mode = False      # Track if we're in build mode
@@ -63,8 +111,24 @@ class Game:
         
         # Command buttons (initialized in _create_command_buttons)
         self.command_buttons = []
+        self._command_button_grid = {}  # (col, row) -> visible command button
+        self._buttons_by_key = {}       # Hotkey -> button id
+        self._command_cards = {}        # Card name -> (buttons, grid), built on first use
         self._create_command_buttons()
         
+        # Command dispatch table (commands without a handler, like move/gather, are no-ops)
+        self._command_handlers = {
+            "build": self._cmd_build,
+            "build_unit_building": self._cmd_build_unit_building,
+            "build_turret": self._cmd_build_turret,
+            "attack": self._cmd_attack,
+            "patrol": self._cmd_patrol,
+            "hold": self._cmd_hold,
+            "square": functools.partial(self._cmd_produce, "square"),
+            "dot": functools.partial(self._cmd_produce, "dot"),
+            "triangle": functools.partial(self._cmd_produce, "triangle"),
+        }
+        
         # Pause enemy button
         self.pause_enemy_button = pygame.Rect(
             self.screen_width - 120, 10, 110, 30
@@ -165,6 +229,12 @@ class Game:
                 "color": YELLOW
             }
         }
+        
+        # Reverse lookup for hotkeys (first button registered for a key wins)
+        self._buttons_by_key = {}
+        for button_id, button in self.all_buttons.items():
+            if button["key"] is not None:
+                self._buttons_by_key.setdefault(button["key"], button_id)
     
     def _init_map(self):
         """Initialize the game map with resources and starting buildings."""
@@ -221,14 +291,15 @@ class Game:
     def add_entity(self, entity):
         """Add an entity to the game."""
         self.entities.append(entity)
+        self.spatial_hash.insert(entity)
         return entity
     
     def remove_entity(self, entity):
         """Remove an entity from the game."""
         if entity in self.entities:
             self.entities.remove(entity)
-            if entity in self.selected_entities:
-                self.selected_entities.remove(entity)
+            self.spatial_hash.remove(entity)
+            self._remove_from_selection(entity)
     
     def update(self, dt):
         """Update the game state for one frame."""
@@ -271,8 +342,12 @@ class Game:
                     # If it fails to remove, force remove from lists
                     if entity in self.entities:
                         self.entities.remove(entity)
-                    if entity in self.selected_entities:
-                        self.selected_entities.remove(entity)
+                    self.spatial_hash.remove(entity)
+                    self._remove_from_selection(entity)
+            
+            # Re-bucket entities that moved into different grid cells
+            for entity in self.entities:
+                self.spatial_hash.update(entity)
             
             # Check win/lose conditions
             self._check_game_over()
@@ -315,7 +390,7 @@ class Game:
         try:
             # Get all enemy units and buildings
             enemy_units = [e for e in self.entities 
-                          if hasattr(e, 'player_id') and e.player_id == 1]
+                          if e.player_id == 1]
             
             enemy_command_centers = [e for e in enemy_units if isinstance(e, CommandCenter)]
             enemy_workers = [e for e in enemy_units if isinstance(e, Square)]
@@ -379,7 +454,7 @@ class Game:
                 try:
                     # Find player targets
                     player_units = [e for e in self.entities 
-                                  if hasattr(e, 'player_id') and e.player_id == 0]
+                                  if e.player_id == 0]
                                   
                     if player_units:
                         # Choose a random target
@@ -399,25 +474,38 @@ class Game:
         # Clear screen
         screen.fill(BLACK)
         
-        # Render all entities
-        for entity in self.entities:
-            entity.render(renderer)
+        # Render all entities, batched so their draws share screen locks
+        unit_polygons = self._build_unit_polygons()
+        renderer.begin_batch()
+        try:
+            for entity in self.entities:
+                points = unit_polygons.get(entity)
+                if points is None:
+                    entity.render(renderer)
+                else:
+                    entity.render(renderer, points)
+        finally:
+            renderer.end_batch()
         
         # Render selection box if selecting
         if self.is_selecting and self.selection_start and self.selection_end:
             renderer.draw_selection_box(self.selection_start, self.selection_end)
         
-        # Render building preview if in build mode
-        if self.build_mode and pygame.mouse.get_pos()[1] < self.screen_height - self.ui_panel_height:
-            self._render_building_preview(screen, renderer, pygame.mouse.get_pos())
-        
-        # Render attack-move cursor if in attack-move mode
-        if self.attack_move_mode and pygame.mouse.get_pos()[1] < self.screen_height - self.ui_panel_height:
-            self._render_attack_move_cursor(screen, renderer, pygame.mouse.get_pos())
-        
-        # Render patrol cursor if in patrol mode
-        if self.patrol_mode and pygame.mouse.get_pos()[1] < self.screen_height - self.ui_panel_height:
-            self._render_patrol_cursor(screen, renderer, pygame.mouse.get_pos())
+        # Cursor overlays are only drawn while the mouse is over the world
+        if self.build_mode or self.attack_move_mode or self.patrol_mode:
+            mouse_pos = pygame.mouse.get_pos()
+            if mouse_pos[1] < self.screen_height - self.ui_panel_height:
+                # Render building preview if in build mode
+                if self.build_mode:
+                    self._render_building_preview(screen, renderer, mouse_pos)
+                
+                # Render attack-move cursor if in attack-move mode
+                if self.attack_move_mode:
+                    self._render_attack_move_cursor(screen, renderer, mouse_pos)
+                
+                # Render patrol cursor if in patrol mode
+                if self.patrol_mode:
+                    self._render_patrol_cursor(screen, renderer, mouse_pos)
         
         # Render UI
         self._render_ui(screen, renderer)
@@ -426,9 +514,11 @@ class Game:
         button_color = RED if self.enemy_ai_paused else GREEN
         pygame.draw.rect(screen, button_color, self.pause_enemy_button)
         button_text = "ENEMY PAUSED" if self.enemy_ai_paused else "PAUSE ENEMY"
-        self.font_small.render_to(screen, 
+        text_rect = self.font_small.render_to(screen, 
                                  (self.pause_enemy_button.x + 10, self.pause_enemy_button.y + 8), 
                                  button_text, WHITE)
+        renderer.mark_dirty(self.pause_enemy_button)
+        renderer.mark_dirty(text_rect)
         
         # Render debug info
         if self.show_debug:
@@ -438,11 +528,27 @@ class Game:
         if self.game_over:
             self._render_game_over(screen, renderer)
     
+    def _build_unit_polygons(self):
+        """Build the vertices of every Square and Triangle with one NumPy pass per shape."""
+        unit_polygons = {}
+        for unit_class, unit_points in ((Square, UNIT_SQUARE), (Triangle, UNIT_TRIANGLE)):
+            units = [e for e in self.entities if e.__class__ is unit_class]
+            if not units:
+                continue
+            vertices = transform_polygons(
+                unit_points,
+                [unit.position for unit in units],
+                [unit.size for unit in units],
+                [unit.angle for unit in units]
+            )
+            unit_polygons.update(zip(units, vertices.tolist()))
+        return unit_polygons
+    
     def _render_building_preview(self, screen, renderer, pos):
         """Render a preview of the building at the mouse position."""
         if self.build_type == "unit_building":
             # Draw a semi-transparent preview
-            pygame.draw.polygon(screen, (*YELLOW, 128),  # RGBA with 50% alpha
+            preview_rect = pygame.draw.polygon(screen, (*YELLOW, 128),  # RGBA with 50% alpha
                                [(pos[0] - 30, pos[1] - 30), 
                                 (pos[0] + 30, pos[1] - 30),
                                 (pos[0] + 30, pos[1] + 30),
@@ -452,9 +558,9 @@ class Game:
             points = []
             size = 20
             for i in range(6):
-                angle = math.pi/3 * i
-                x = pos[0] + math.cos(angle) * size
-                y = pos[1] + math.sin(angle) * size
+                angle = (i * _tau) / 6
+                x = pos[0] + _cos(angle) * size
+                y = pos[1] + _sin(angle) * size
                 points.append((int(x), int(y)))
             
             # Draw the hexagon with semi-transparency
@@ -466,8 +572,12 @@ class Game:
                             (pos[0] + size, pos[1]), 
                             3)
             
-            # Draw attack range indicator
-            pygame.draw.circle(screen, (255, 255, 255, 30), pos, 150, 1)
+            # Draw attack range indicator, which encloses the rest of the preview
+            preview_rect = pygame.draw.circle(screen, (255, 255, 255, 30), pos, 150, 1)
+        else:
+            return
+        
+        renderer.mark_dirty(preview_rect)
     
     def _render_attack_move_cursor(self, screen, renderer, pos):
         """Render a custom cursor for attack-move mode."""
@@ -475,6 +585,7 @@ class Game:
         pygame.draw.circle(screen, RED, pos, 15, 2)
         pygame.draw.line(screen, RED, (pos[0] - 20, pos[1]), (pos[0] + 20, pos[1]), 2)
         pygame.draw.line(screen, RED, (pos[0], pos[1] - 20), (pos[0], pos[1] + 20), 2)
+        renderer.mark_dirty((pos[0] - 21, pos[1] - 21, 42, 42))
     
     def _render_patrol_cursor(self, screen, renderer, pos):
         """Render a custom cursor for patrol mode."""
@@ -519,13 +630,17 @@ class Game:
             (pos[0] - arrow_width, pos[1] + arrow_length - arrow_width),
             (pos[0] + arrow_width, pos[1] + arrow_length - arrow_width)
         ])
+        renderer.mark_dirty((pos[0] - arrow_length - 1, pos[1] - arrow_length - 1,
+                             arrow_length * 2 + 2, arrow_length * 2 + 2))
     
     def _render_ui(self, screen, renderer):
         """Render the game UI."""
         # Draw the bottom UI panel
-        pygame.draw.rect(screen, (50, 50, 50), 
+        panel_rect = pygame.draw.rect(screen, (50, 50, 50), 
                          (0, self.screen_height - self.ui_panel_height, 
                           self.screen_width, self.ui_panel_height))
+        # Everything below is drawn inside the panel, apart from button tooltips
+        renderer.mark_dirty(panel_rect)
         
         # Draw minimap on the left
         pygame.draw.rect(screen, (0, 0, 0), 
@@ -544,54 +659,37 @@ class Game:
                                  resource_text, WHITE)
         
         # Render command buttons based on selection
-        self._render_command_buttons(screen)
+        self._render_command_buttons(screen, renderer)
         
         # Render minimap
         self._render_minimap(screen)
     
-    def _render_command_buttons(self, screen):
+    def _render_command_buttons(self, screen, renderer):
         """Render command buttons based on current selection."""
         # Determine which buttons to show based on selection
         selected_types = set()
-        for entity in self.selected_entities:
-            if isinstance(entity, Square) and entity.player_id == 0:
-                selected_types.add("worker")
-            elif isinstance(entity, (Dot, Triangle)) and entity.player_id == 0:
-                selected_types.add("combat")
-            elif isinstance(entity, CommandCenter) and entity.player_id == 0:
+        if self._selected_by_type["worker"]:
+            selected_types.add("worker")
+        if self._selected_by_type["combat"]:
+            selected_types.add("combat")
+        for building in self._selected_by_type["building"]:
+            if building.__class__ is CommandCenter:
                 selected_types.add("command_center")
-            elif isinstance(entity, UnitBuilding) and entity.player_id == 0:
+            elif building.__class__ is UnitBuilding:
                 selected_types.add("unit_building")
         
-        # Position variables
-        button_size = 40
-        button_margin = 5
-        card_start_x = self.screen_width - self.command_card_size + button_margin
-        card_start_y = self.screen_height - self.ui_panel_height + button_margin
-        
-        # Create visible command buttons based on selection
-        self.command_buttons = []
-        
-        # If worker is selected
-        if "worker" in selected_types:
-            self._add_command_button("move", 0, 0)
-            self._add_command_button("gather", 1, 0)
-            self._add_command_button("build", 2, 0)
-        
-        # If combat unit is selected
-        elif "combat" in selected_types:
-            self._add_command_button("attack", 0, 0)
-            self._add_command_button("hold", 1, 0)
-            self._add_command_button("patrol", 2, 0)
-        
-        # If command center is selected
-        elif "command_center" in selected_types:
-            self._add_command_button("square", 0, 0)
+        # Pick the card for the selection; its buttons and rects are reused between frames
+        card = None
+        for card_name in _COMMAND_CARD_LAYOUTS:
+            if card_name in selected_types:
+                card = card_name
+                break
         
-        # If unit building is selected
-        elif "unit_building" in selected_types:
-            self._add_command_button("dot", 0, 0)
-            self._add_command_button("triangle", 1, 0)
+        if card is None:
+            self.command_buttons = []
+            self._command_button_grid = {}
+        else:
+            self.command_buttons, self._command_button_grid = self._get_command_card(card)
         
         # Render all visible buttons
         for button in self.command_buttons:
@@ -615,33 +713,43 @@ class Game:
                     len(button["tooltip"]) * 7,
                     25
                 )
-                pygame.draw.rect(screen, (50, 50, 50), tooltip_bg)
-                self.font_small.render_to(
+                renderer.mark_dirty(pygame.draw.rect(screen, (50, 50, 50), tooltip_bg))
+                renderer.mark_dirty(self.font_small.render_to(
                     screen,
                     (mouse_pos[0] + 15, mouse_pos[1] - 25),
                     button["tooltip"],
                     WHITE
-                )
+                ))
     
-    def _add_command_button(self, button_id, col, row):
-        """Add a command button to the visible list."""
+    def _get_command_card(self, card):
+        """Get the (buttons, grid) for a command card, creating its rects on first use."""
+        cached = self._command_cards.get(card)
+        if cached is not None:
+            return cached
+        
         button_size = 40
         button_margin = 5
         card_start_x = self.screen_width - self.command_card_size + button_margin
         card_start_y = self.screen_height - self.ui_panel_height + button_margin
         
-        # Get button data
-        button_data = self.all_buttons[button_id].copy()
-        
-        # Calculate position based on col/row
-        x = card_start_x + (button_size + button_margin) * col
-        y = card_start_y + (button_size + button_margin) * row
-        
-        # Create rectangle for the button
-        button_data["rect"] = pygame.Rect(x, y, button_size, button_size)
+        buttons = []
+        grid = {}
+        for button_id, col, row in _COMMAND_CARD_LAYOUTS[card]:
+            # Get button data
+            button_data = self.all_buttons[button_id].copy()
+            
+            # Calculate position based on col/row
+            x = card_start_x + (button_size + button_margin) * col
+            y = card_start_y + (button_size + button_margin) * row
+            
+            # Create rectangle for the button
+            button_data["rect"] = pygame.Rect(x, y, button_size, button_size)
+            
+            buttons.append(button_data)
+            grid[(col, row)] = button_data
         
-        # Add to visible buttons
-        self.command_buttons.append(button_data)
+        self._command_cards[card] = (buttons, grid)
+        return buttons, grid
     
     def _render_minimap(self, screen):
         """Render a minimap showing entities."""
@@ -654,39 +762,44 @@ class Game:
         scale_x = minimap_rect.width / self.world_width
         scale_y = minimap_rect.height / self.world_height
         
-        # Draw entities on minimap
-        for entity in self.entities:
-            # Skip entities with no position
-            if not hasattr(entity, 'position'):
-                continue
+        # Draw entities on minimap, holding one lock for the whole run of dots
+        # instead of letting each draw call lock and unlock the screen
+        screen.lock()
+        try:
+            for entity in self.entities:
+                # Skip entities with no position
+                if not hasattr(entity, 'position'):
+                    continue
                 
-            # Calculate minimap position
-            mini_x = minimap_rect.x + entity.position[0] * scale_x
-            mini_y = minimap_rect.y + entity.position[1] * scale_y
-            
-            # Determine color and size based on entity type
-            color = WHITE
-            size = 1
-            
-            if isinstance(entity, Resource):
-                color = CYAN
-                size = 1
-            elif isinstance(entity, Building):
-                if entity.player_id == 0:
-                    color = BLUE
-                else:
-                    color = RED
-                size = 3
-            elif isinstance(entity, Unit):
-                if entity.player_id == 0:
-                    color = GREEN
-                else:
-                    color = RED
+                # Calculate minimap position
+                mini_x = minimap_rect.x + entity.position[0] * scale_x
+                mini_y = minimap_rect.y + entity.position[1] * scale_y
+                
+                # Determine color and size based on entity type
+                color = WHITE
                 size = 1
-            
-            # Draw the entity on the minimap
-            if 0 <= mini_x <= minimap_rect.right and 0 <= mini_y <= minimap_rect.bottom:
-                pygame.draw.circle(screen, color, (int(mini_x), int(mini_y)), size)
+                
+                if isinstance(entity, Resource):
+                    color = CYAN
+                    size = 1
+                elif isinstance(entity, Building):
+                    if entity.player_id == 0:
+                        color = BLUE
+                    else:
+                        color = RED
+                    size = 3
+                elif isinstance(entity, Unit):
+                    if entity.player_id == 0:
+                        color = GREEN
+                    else:
+                        color = RED
+                    size = 1
+                
+                # Draw the entity on the minimap
+                if 0 <= mini_x <= minimap_rect.right and 0 <= mini_y <= minimap_rect.bottom:
+                    pygame.draw.circle(screen, color, (int(mini_x), int(mini_y)), size)
+        finally:
+            screen.unlock()
         
         # Draw the current viewport as a rectangle
         viewport_rect = pygame.Rect(
@@ -707,19 +820,21 @@ class Game:
             world_y = (mouse_pos[1] - minimap_rect.y) / scale_y
             
             # Center the camera on the clicked position
-            self.camera_offset[0] = max(0, min(world_x - self.screen_width/2, self.world_width - self.screen_width))
-            self.camera_offset[1] = max(0, min(world_y - self.screen_height/2, self.world_height - self.screen_height))
+            self.camera_offset = (
+                float(max(0, min(world_x - self.screen_width/2, self.world_width - self.screen_width))),
+                float(max(0, min(world_y - self.screen_height/2, self.world_height - self.screen_height)))
+            )
     
     def _render_debug(self, screen, renderer):
         """Render debug information."""
         # Entity count
         entity_count = len(self.entities)
         text = f"Entities: {entity_count}"
-        self.font_small.render_to(screen, (10, 40), text, WHITE)
+        renderer.mark_dirty(self.font_small.render_to(screen, (10, 40), text, WHITE))
         
         # FPS (calculate outside)
         fps_text = f"FPS: {pygame.time.Clock().get_fps():.1f}"
-        self.font_small.render_to(screen, (10, 60), fps_text, WHITE)
+        renderer.mark_dirty(self.font_small.render_to(screen, (10, 60), fps_text, WHITE))
         
         # Selected entities info
         if self.selected_entities:
@@ -734,7 +849,7 @@ class Game:
                     health_text = ""
                 
                 info_text = f"[{i}] {entity_class}{health_text} at {entity_pos}"
-                self.font_small.render_to(screen, (10, y_offset), info_text, WHITE)
+                renderer.mark_dirty(self.font_small.render_to(screen, (10, y_offset), info_text, WHITE))
                 y_offset += 20
     
     def _render_game_over(self, screen, renderer):
@@ -742,7 +857,7 @@ class Game:
         # Transparent overlay
         overlay = pygame.Surface((self.screen_width, self.screen_height), pygame.SRCALPHA)
         overlay.fill((0, 0, 0, 128))
-        screen.blit(overlay, (0, 0))
+        renderer.mark_dirty(screen.blit(overlay, (0, 0)))
         
         # Game over text
         game_over_text = "GAME OVER"
@@ -799,9 +914,7 @@ class Game:
                 self.paused = not self.paused
             elif event.key == pygame.K_p:  # P now controls patrol mode
                 # Check if we have combat units selected
-                combat_units = [e for e in self.selected_entities 
-                              if isinstance(e, (Dot, Triangle)) and e.player_id == 0]
-                if combat_units:
+                if self._selected_by_type["combat"]:
                     self.patrol_mode = True
                     self.print_debug_info("Patrol mode - click target location")
             elif event.key == pygame.K_F3:
@@ -815,6 +928,7 @@ class Game:
         
         # Handle mouse events
         elif event.type == pygame.MOUSEBUTTONDOWN:
+            self._mods_cache = pygame.key.get_mods()
             if event.button == 1:  # Left click
                 # Check if clicking on pause enemy button
                 if self.pause_enemy_button.collidepoint(event.pos):
@@ -827,6 +941,7 @@ class Game:
                 self._handle_right_click(event.pos)
         
         elif event.type == pygame.MOUSEBUTTONUP:
+            self._mods_cache = pygame.key.get_mods()
             if event.button == 1:  # Left release
                 self._handle_left_release(event.pos)
         
@@ -838,11 +953,11 @@ class Game:
     
     def _handle_key_command(self, key):
         """Handle keyboard command inputs."""
-        # Look for buttons with this key
-        for button_id, button in self.all_buttons.items():
-            if button["key"] == key:
-                self._execute_command(button_id)
-                return
+        # Look for a button with this key
+        button_id = self._buttons_by_key.get(key)
+        if button_id is not None:
+            self._execute_command(button_id)
+            return
         
         # If no button found, check additional global commands
         if key == pygame.K_b:
@@ -858,72 +973,68 @@ class Game:
     
     def _execute_command(self, command_type):
         """Execute a command based on its type."""
-        # Worker commands
-        if command_type == "build":
-            workers_selected = any(isinstance(e, Square) and e.player_id == 0 for e in self.selected_entities)
-            if workers_selected and self.resources[0] >= self.unit_building_cost:
-                self.build_mode = True
-                self.build_type = "select"
-                self.print_debug_info("Entered build mode - select building type (U: Unit Building, T: Turret)")
-        
-        elif command_type == "build_unit_building":
-            workers_selected = any(isinstance(e, Square) and e.player_id == 0 for e in self.selected_entities)
-            if workers_selected and self.resources[0] >= self.unit_building_cost:
-                self.build_mode = True
-                self.build_type = "unit_building"
-                self.print_debug_info("Building Unit Building - click to place")
-                
-        elif command_type == "build_turret":
-            workers_selected = any(isinstance(e, Square) and e.player_id == 0 for e in self.selected_entities)
-            if workers_selected and self.resources[0] >= 100:  # Turret cost
-                self.build_mode = True
-                self.build_type = "turret"
-                self.print_debug_info("Building Turret - click to place")
-        
-        # Combat unit commands
-        elif command_type == "attack":
-            combat_units = [e for e in self.selected_entities 
-                           if isinstance(e, (Dot, Triangle)) and e.player_id == 0]
-            if combat_units:
-                self.attack_move_mode = True
-                # Change cursor to attack cursor
-                pygame.mouse.set_visible(False)  # Hide default cursor
-                self.print_debug_info("Attack-move mode - click target location with left or right button")
-        
-        elif command_type == "patrol":
-            combat_units = [e for e in self.selected_entities 
-                          if isinstance(e, (Dot, Triangle)) and e.player_id == 0]
-            if combat_units:
-                self.patrol_mode = True
-                self.print_debug_info("Patrol mode - click target location")
-        
-        elif command_type == "hold":
-            combat_units = [e for e in self.selected_entities 
-                          if isinstance(e, Unit) and e.player_id == 0]
-            for unit in combat_units:
-                # Create and assign a hold position behavior
-                hold_behavior = behaviors.HoldPositionBehavior(unit)
-                unit.current_behavior = hold_behavior
-                self.print_debug_info(f"Unit holding position at {unit.position}")
-        
-        # Building production commands
-        elif command_type == "square":
-            selected_buildings = [e for e in self.selected_entities if isinstance(e, CommandCenter)]
-            if selected_buildings:
-                selected_buildings[0].produce("square")
-                self.print_debug_info("Producing a Square worker")
-        
-        elif command_type == "dot":
-            selected_buildings = [e for e in self.selected_entities if isinstance(e, UnitBuilding)]
-            if selected_buildings:
-                selected_buildings[0].produce("dot")
-                self.print_debug_info("Producing a Dot unit")
-        
-        elif command_type == "triangle":
-            selected_buildings = [e for e in self.selected_entities if isinstance(e, UnitBuilding)]
-            if selected_buildings:
-                selected_buildings[0].produce("triangle")
-                self.print_debug_info("Producing a Triangle unit")
+        handler = self._command_handlers.get(command_type)
+        if handler is not None:
+            handler()
+    
+    # Worker commands
+    def _cmd_build(self):
+        """Enter build mode to choose a building type."""
+        workers_selected = bool(self._selected_by_type["worker"])
+        if workers_selected and self.resources[0] >= self.unit_building_cost:
+            self.build_mode = True
+            self.build_type = "select"
+            self.print_debug_info("Entered build mode - select building type (U: Unit Building, T: Turret)")
+    
+    def _cmd_build_unit_building(self):
+        """Start placing a unit building."""
+        workers_selected = bool(self._selected_by_type["worker"])
+        if workers_selected and self.resources[0] >= self.unit_building_cost:
+            self.build_mode = True
+            self.build_type = "unit_building"
+            self.print_debug_info("Building Unit Building - click to place")
+    
+    def _cmd_build_turret(self):
+        """Start placing a turret."""
+        workers_selected = bool(self._selected_by_type["worker"])
+        if workers_selected and self.resources[0] >= 100:  # Turret cost
+            self.build_mode = True
+            self.build_type = "turret"
+            self.print_debug_info("Building Turret - click to place")
+    
+    # Combat unit commands
+    def _cmd_attack(self):
+        """Enter attack-move mode."""
+        if self._selected_by_type["combat"]:
+            self.attack_move_mode = True
+            # Change cursor to attack cursor
+            pygame.mouse.set_visible(False)  # Hide default cursor
+            self.print_debug_info("Attack-move mode - click target location with left or right button")
+    
+    def _cmd_patrol(self):
+        """Enter patrol mode."""
+        if self._selected_by_type["combat"]:
+            self.patrol_mode = True
+            self.print_debug_info("Patrol mode - click target location")
+    
+    def _cmd_hold(self):
+        """Order selected units to hold position."""
+        units = self._selected_by_type["worker"] + self._selected_by_type["combat"]
+        for unit in units:
+            # Create and assign a hold position behavior
+            hold_behavior = behaviors.HoldPositionBehavior(unit)
+            unit.current_behavior = hold_behavior
+            self.print_debug_info(f"Unit holding position at {unit.position}")
+    
+    # Building production commands
+    def _cmd_produce(self, unit_type):
+        """Queue a unit at the first selected building that can produce it."""
+        building_class, message = _PRODUCE_MAP[unit_type]
+        for building in self._selected_by_type["building"]:
+            if building.__class__ is building_class:
+                building.produce(unit_type)
+                self.print_debug_info(message)
+                break
     
     def _handle_left_click(self, pos):
         """Handle left mouse button click."""
@@ -988,31 +1099,23 @@ class Game:
     def _handle_selection_click(self, pos):
         """Handle selecting a single entity with a click."""
         # Deselect all if no shift key
-        if not pygame.key.get_mods() & pygame.KMOD_SHIFT:
-            for entity in self.selected_entities:
-                entity.deselect()
-            self.selected_entities = []
+        if not self._mods_cache & pygame.KMOD_SHIFT:
+            self._deselect_all()
         
         # Check for entity at click position (prioritize units and buildings over resources)
-        clicked_entities = []
+        hit_entities = [e for e in self.spatial_hash.query_point(pos) if e.contains_point(pos)]
         
         # First pass: check buildings and units
-        for entity in self.entities:
-            if (hasattr(entity, 'player_id') and entity.player_id == 0 and 
-                entity.contains_point(pos)):
-                clicked_entities.append(entity)
+        clicked_entities = [e for e in hit_entities 
+                            if e.player_id == 0]
         
         # Second pass: if no buildings or units, check resources
         if not clicked_entities:
-            for entity in self.entities:
-                if isinstance(entity, Resource) and entity.contains_point(pos):
-                    clicked_entities.append(entity)
+            clicked_entities = [e for e in hit_entities if isinstance(e, Resource)]
         
         # Select the first (top) entity
         if clicked_entities:
-            entity = clicked_entities[0]
-            entity.select()
-            self.selected_entities.append(entity)
+            self._add_to_selection(clicked_entities[0])
     
     def _handle_selection_box(self, start, end):
         """Handle selecting multiple entities with a selection box."""
@@ -1024,18 +1127,18 @@ class Game:
         selection_rect = pygame.Rect(x, y, width, height)
         
         # Deselect all if no shift key
-        if not pygame.key.get_mods() & pygame.KMOD_SHIFT:
-            for entity in self.selected_entities:
-                entity.deselect()
-            self.selected_entities = []
+        if not self._mods_cache & pygame.KMOD_SHIFT:
+            self._deselect_all()
+        
+        # Filter the grid candidates in one pass before touching selection state
+        colliderect = selection_rect.colliderect
+        boxed_entities = [e for e in self.spatial_hash.query_rect(selection_rect)
+                          if e.player_id == 0 and colliderect(e.rect)]
         
         # Select all player units and buildings in the box
-        for entity in self.entities:
-            if (hasattr(entity, 'player_id') and entity.player_id == 0 and 
-                selection_rect.colliderect(entity.rect)):
-                if entity not in self.selected_entities:
-                    entity.select()
-                    self.selected_entities.append(entity)
+        for entity in boxed_entities:
+            if id(entity) not in self._selected_ids:
+                self._add_to_selection(entity)
     
     def _handle_right_click(self, pos):
         """Handle right mouse button click."""
@@ -1052,32 +1155,26 @@ class Game:
             return
         
         # Check if clicked on an entity
-        target_entity = None
-        for entity in self.entities:
-            if hasattr(entity, 'contains_point') and entity.contains_point(pos):
-                target_entity = entity
-                break
+        target_entity = self._get_entity_at_position(pos)
         
         # If we have a target entity
         if target_entity:
             # If target is a resource, gather resources
             if isinstance(target_entity, Resource):
                 found_workers = False
-                for entity in self.selected_entities:
-                    if isinstance(entity, Square) and entity.player_id == 0:
-                        self.print_debug_info(f"Ordering worker to gather from resource with {target_entity.amount} remaining")
-                        entity.gather(target_entity)
-                        found_workers = True
+                for entity in self._selected_by_type["worker"]:
+                    self.print_debug_info(f"Ordering worker to gather from resource with {target_entity.amount} remaining")
+                    entity.gather(target_entity)
+                    found_workers = True
                 
                 if not found_workers:
                     self.print_debug_info("No workers selected to gather resources")
             
             # If target is an enemy unit or building, attack it
-            elif hasattr(target_entity, 'player_id') and target_entity.player_id == 1:
+            elif target_entity.player_id == 1:
                 found_attackers = False
-                for entity in self.selected_entities:
-                    if (isinstance(entity, (Dot, Triangle)) and entity.player_id == 0 and 
-                        hasattr(entity, 'attack_damage') and entity.attack_damage > 0):
+                for entity in self._selected_by_type["combat"]:
+                    if entity.attack_damage > 0:
                         self.print_debug_info(f"Ordering attack on enemy {type(target_entity).__name__}")
                         entity.attack(target_entity)
                         found_attackers = True
@@ -1086,75 +1183,79 @@ class Game:
                     self.print_debug_info("No combat units selected to attack")
             
             # If target is a friendly building, just select it
-            elif hasattr(target_entity, 'player_id') and target_entity.player_id == 0:
+            elif target_entity.player_id == 0:
                 self._handle_selection_click(pos)
         
         # No target entity, move units
         else:
             # Move selected units with formation spreading
-            selected_units = [e for e in self.selected_entities if isinstance(e, Unit) and e.player_id == 0]
+            selected_units, x_offsets, y_offsets = self._get_formation()
             
             if len(selected_units) > 1:
-                try:
-                    # Calculate formation radius based on number of units
-                    # More units = bigger formation, but less dramatic spacing
-                    num_units = len(selected_units)
-                    formation_radius = max(20, 10 * (num_units ** 0.5))
-                    
-                    # Calculate positions in a rough circle/grid formation around the target
-                    for i, entity in enumerate(selected_units):
-                        # Safety check to prevent division by zero
-                        if num_units <= 0:
-                            entity.move_to(pos)
-                            continue
-                            
-                        # Calculate angle for circular formation
-                        angle = (i / num_units) * 2 * 3.14159
-                        
-                        # Calculate offset from center
-                        offset_x = formation_radius * math.cos(angle)
-                        offset_y = formation_radius * math.sin(angle)
-                        
-                        # Calculate final position with slight random variation
-                        # Random variation helps prevent units from getting symmetrically stuck
-                        random_offset = 5.0  # Small random offset to prevent exact symmetrical formations
-                        final_pos = (
-                            pos[0] + offset_x + random.uniform(-random_offset, random_offset),
-                            pos[1] + offset_y + random.uniform(-random_offset, random_offset)
-                        )
-                        
-                        # Ensure positions are valid numbers
-                        if (isinstance(final_pos[0], (int, float)) and 
-                            isinstance(final_pos[1], (int, float)) and
-                            not math.isnan(final_pos[0]) and 
-                            not math.isnan(final_pos[1])):
-                            # Order unit to move
-                            entity.move_to(final_pos)
-                        else:
-                            # Use original position as fallback
-                            entity.move_to(pos)
-                except Exception as e:
-                    # If formation calculation fails, fall back to simple movement
-                    print(f"Formation calculation error: {e}")
-                    for entity in selected_units:
-                        entity.move_to(pos)
+                num_units = len(selected_units)
+                
+                # Slight random variation helps prevent units from getting symmetrically stuck
+                random_offset = 5.0
+                noise = np.random.uniform(-random_offset, random_offset, size=(num_units, 2))
+                
+                target_x = pos[0] + x_offsets + noise[:, 0]
+                target_y = pos[1] + y_offsets + noise[:, 1]
+                assert np.isfinite(target_x).all() and np.isfinite(target_y).all()
+                
+                # Order units to move
+                for entity, x, y in zip(selected_units, target_x.tolist(), target_y.tolist()):
+                    entity.move_to((x, y))
             else:
                 # For single unit, just move to the exact position
                 for entity in selected_units:
                     entity.move_to(pos)
             
             # Set rally points for selected buildings
-            for entity in self.selected_entities:
-                if isinstance(entity, Building) and entity.player_id == 0:
-                    entity.set_rally_point(pos)
+            for entity in self._selected_by_type["building"]:
+                entity.set_rally_point(pos)
+    
+    def _get_formation(self):
+        """Get the selected units and their formation offsets, reused until the selection changes."""
+        cache = self._formation_cache
+        if cache is not None and cache[0] == self._selection_version:
+            return cache[1], cache[2], cache[3]
+        
+        selected_units = self._selected_by_type["worker"] + self._selected_by_type["combat"]
+        num_units = len(selected_units)
+        x_offsets = y_offsets = None
+        if num_units > 1:
+            # Calculate formation radius based on number of units
+            # More units = bigger formation, but less dramatic spacing
+            formation_radius = max(20, 10 * (num_units ** 0.5))
+            
+            # Calculate positions in a rough circle/grid formation around the target
+            cos_offsets, sin_offsets = _formation_unit_offsets(num_units)
+            x_offsets = cos_offsets * formation_radius
+            y_offsets = sin_offsets * formation_radius
+        
+        self._formation_cache = (self._selection_version, selected_units, x_offsets, y_offsets)
+        return selected_units, x_offsets, y_offsets
+    
+    def _get_entity_at_position(self, pos):
+        """Get the entity at the given world position, or None."""
+        return self.spatial_hash.pick(pos)
     
     def _handle_ui_click(self, pos):
         """Handle clicking on UI elements."""
-        # Check if click is on a command button
-        for button in self.command_buttons:
-            if button["rect"].collidepoint(pos):
-                self._execute_command(button["type"])
-                return True
+        button_size = 40
+        button_margin = 5
+        card_start_x = self.screen_width - self.command_card_size + button_margin
+        card_start_y = self.screen_height - self.ui_panel_height + button_margin
+        
+        # Buttons sit on a fixed grid, so find the cell under the click directly
+        col = (pos[0] - card_start_x) // (button_size + button_margin)
+        row = (pos[1] - card_start_y) // (button_size + button_margin)
+        button = self._command_button_grid.get((col, row))
+        
+        # Check if click is on the button itself rather than the margin around it
+        if button and button["rect"].collidepoint(pos):
+            self._execute_command(button["type"])
+            return True
         
         return False
     
@@ -1166,7 +1267,7 @@ class Game:
             return False
         
         # Find selected or nearby workers
-        workers = [e for e in self.selected_entities if isinstance(e, Square) and e.player_id == 0]
+        workers = self._selected_by_type["worker"]
         
         if not workers:
             self.print_debug_info("No workers selected to build")
@@ -1174,10 +1275,11 @@ class Game:
         
         # If position is provided, find the closest worker to that position
         if pos:
-            closest_worker = min(workers, key=lambda w: distance(w.position, pos))
+            # Compare squared distances to avoid a sqrt per worker
+            closest_worker = min(workers, key=lambda w: distance_sq(w.position, pos))
             
             # Check if worker is close enough to build
-            if distance(closest_worker.position, pos) > 150:  # Maximum build distance
+            if distance_sq(closest_worker.position, pos) > 150 * 150:  # Maximum build distance
                 self.print_debug_info("Worker too far from build location")
                 return False
                 
@@ -1214,13 +1316,10 @@ class Game:
     def _select_single_entity(self, entity):
         """Select a single entity, deselecting all others."""
         # Deselect all current selections
-        for e in self.selected_entities:
-            e.deselect()
-        self.selected_entities = []
+        self._deselect_all()
         
         # Select the new entity
-        entity.select()
-        self.selected_entities.append(entity)
+        self._add_to_selection(entity)
     
     def _try_build_turret(self, pos=None):
         """Try to build a defensive turret at the given position."""
@@ -1233,7 +1332,7 @@ class Game:
             return False
         
         # Find selected or nearby workers
-        workers = [e for e in self.selected_entities if isinstance(e, Square) and e.player_id == 0]
+        workers = self._selected_by_type["worker"]
         
         if not workers:
             self.print_debug_info("No workers selected to build")
@@ -1241,10 +1340,11 @@ class Game:
         
         # If position is provided, find the closest worker to that position
         if pos:
-            closest_worker = min(workers, key=lambda w: distance(w.position, pos))
+            # Compare squared distances to avoid a sqrt per worker
+            closest_worker = min(workers, key=lambda w: distance_sq(w.position, pos))
             
             # Check if worker is close enough to build
-            if distance(closest_worker.position, pos) > 150:  # Maximum build distance
+            if distance_sq(closest_worker.position, pos) > 150 * 150:  # Maximum build distance
                 self.print_debug_info("Worker too far from build location")
                 return False
                 
@@ -1276,7 +1376,8 @@ class Game:
     def _restart_game(self):
         """Restart the game."""
         self.entities = []
-        self.selected_entities = []
+        self.spatial_hash.clear()
+        self._deselect_all()
         self.resources = [200, 200]
         self.game_over = False
         self.winner = None
@@ -1292,17 +1393,42 @@ class Game:
             print(message)
 
     def _deselect_all(self):
-        """Deselect all selected entities."""
+        """Deselect all selected entities.
+        
+        The selection lists are cleared in place so references held elsewhere
+        stay valid.
+        """
         for entity in self.selected_entities:
             entity.deselect()
-        self.selected_entities = []
+        self.selected_entities.clear()
+        self._selected_ids.clear()
+        self._selection_version += 1
+        for bucket in self._selected_by_type.values():
+            bucket.clear()
+    
+    def _add_to_selection(self, entity):
+        """Select an entity and file it in its typed selection bucket."""
+        entity.select()
+        self.selected_entities.append(entity)
+        self._selected_ids.add(id(entity))
+        self._selection_version += 1
+        bucket = _SELECTION_BUCKETS.get(entity.__class__)
+        if bucket is not None and entity.player_id == 0:
+            self._selected_by_type[bucket].append(entity)
+    
+    def _remove_from_selection(self, entity):
+        """Drop an entity from the selection without changing its selected flag."""
+        if id(entity) in self._selected_ids:
+            self.selected_entities.remove(entity)
+            self._selected_ids.discard(id(entity))
+            self._selection_version += 1
+            bucket = _SELECTION_BUCKETS.get(entity.__class__)
+            if bucket is not None and entity in self._selected_by_type[bucket]:
+                self._selected_by_type[bucket].remove(entity)
     
     def _execute_attack_move(self, pos):
         """Execute attack-move command to the target position."""
-        combat_units = [e for e in self.selected_entities 
-                      if isinstance(e, (Dot, Triangle)) and e.player_id == 0]
-        
-        for unit in combat_units:
+        for unit in self._selected_by_type["combat"]:
             unit.current_behavior = behaviors.AttackMoveBehavior(unit, pos)
         
         self.attack_move_mode = False
@@ -1315,14 +1441,11 @@ class Game:
         import behaviors
         
         # Convert screen position to world position
-        world_pos = [
-            pos[0] + self.camera_offset[0],
-            pos[1] + self.camera_offset[1]
-        ]
+        cam_x, cam_y = self.camera_offset
+        world_pos = [pos[0] + cam_x, pos[1] + cam_y]
         
         # Get selected combat units
-        combat_units = [e for e in self.selected_entities 
-                       if isinstance(e, (Dot, Triangle)) and e.player_id == 0]
+        combat_units = self._selected_by_type["combat"]
         
         # Set patrol behavior for each unit
         for unit in combat_units:
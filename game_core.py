@@ -5,6 +5,7 @@ import random
 from utils import WHITE, BLACK, RED, BLUE, GREEN, YELLOW, CYAN, distance
 from entities import Entity, Resource, Unit, Square, Dot, Triangle, Building, CommandCenter, UnitBuilding, Turret
 import behaviors
+from spatial_hash import SpatialHash
 
 # Import the specialized controllers
 from ui_renderer import UIRenderer
@@ -40,6 +41,7 @@ class Game:
         self.paused = False
         self.enemy_ai_paused = False
         self.show_debug = False
+        self.show_grid = False  # Faint world grid, barely visible over the background
         self.game_over = False
         self.winner = None
         
@@ -67,6 +69,10 @@ class Game:
         # UI panel height
         self.ui_panel_height = 150
         
+        # Screen area above the UI panel that shows the world
+        self.world_bottom = self.screen_height - self.ui_panel_height
+        self.world_clip = pygame.Rect(0, 0, self.screen_width, self.world_bottom)
+        
         # Fonts
         self.font_small = freetype.SysFont(None, 20)
         self.font_medium = freetype.SysFont(None, 30)
@@ -77,6 +83,14 @@ class Game:
             self.screen_width - 120, 10, 110, 30
         )
         
+        # Grid index for proximity and hit tests
+        self.spatial_hash = SpatialHash(cell_size=64)
+        
+        # Render layers, bottom to top, kept in step with the entity list
+        self.resources_layer = []
+        self.buildings_layer = []
+        self.units_layer = []
+        
         # Initialize controllers
         self.renderer = None  # Set by main.py
         self.entity_manager = EntityManager(self)
@@ -87,6 +101,7 @@ class Game:
         
         # Initialize the game world
         self.entity_manager.init_map()
+        self._sync_entity_index()
     
     @property
     def entities(self):
@@ -98,16 +113,56 @@ class Game:
         # Store dt for use in rendering animations
         self.dt = dt
         
-        if self.game_over:
-            return
-            
-        if not self.paused:
+        if not self.game_over and not self.paused:
             # Update entities
             self.entity_manager.update(dt)
             
             # Update enemy AI if not paused
             if not self.enemy_ai_paused:
                 self.ai_controller.update(dt)
+        
+        # Keep the grid index and render layers in step with the entity list,
+        # however it changed
+        self._sync_entity_index()
+    
+    def _sync_entity_index(self):
+        """Bring the spatial hash and render layers in step with the entity list.
+        
+        The entity manager owns the entity list and can add or remove entities
+        without going through add_entity/remove_entity, so the index is checked
+        against the list once per frame: new entities are indexed, removed ones
+        dropped and moved ones re-bucketed. The render layers are rebuilt only
+        when the set of entities changed.
+        """
+        entities = self.entities
+        spatial_hash = self.spatial_hash
+        changed = False
+        for entity in entities:
+            if entity in spatial_hash:
+                spatial_hash.update(entity)
+            else:
+                spatial_hash.insert(entity)
+                changed = True
+        
+        # Every listed entity is indexed now, so any surplus is a removed entity
+        if len(spatial_hash) > len(entities):
+            live = set(entities)
+            for entity in [e for e in spatial_hash if e not in live]:
+                spatial_hash.remove(entity)
+            changed = True
+        
+        if changed:
+            self._rebuild_render_layers()
+    
+    def _rebuild_render_layers(self):
+        """Re-bin every renderable entity into its render layer, in list order."""
+        self.resources_layer.clear()
+        self.buildings_layer.clear()
+        self.units_layer.clear()
+        for entity in self.entities:
+            layer = self._render_layer(entity)
+            if layer is not None:
+                layer.append(entity)
     
     def render(self, screen, renderer):
         """Render the game state."""
@@ -115,8 +170,8 @@ class Game:
         if self.renderer is None:
             self.renderer = renderer
         
-        # Clear the screen
-        screen.fill((0, 0, 0))
+        # Clear the UI panel area; the world renderer fills the rest
+        screen.fill((0, 0, 0), (0, self.world_bottom, self.screen_width, self.ui_panel_height))
         
         # Set camera offset in renderer
         renderer.set_camera_offset(self.camera_offset)
@@ -134,10 +189,28 @@ class Game:
     def add_entity(self, entity):
         """Add an entity to the game."""
         self.entity_manager.add_entity(entity)
+        self.spatial_hash.insert(entity)
+        layer = self._render_layer(entity)
+        if layer is not None:
+            layer.append(entity)
     
     def remove_entity(self, entity):
         """Remove an entity from the game."""
         self.entity_manager.remove_entity(entity)
+        self.spatial_hash.remove(entity)
+        layer = self._render_layer(entity)
+        if layer is not None and entity in layer:
+            layer.remove(entity)
+    
+    def _render_layer(self, entity):
+        """Get the render layer an entity belongs to, or None if it isn't drawn."""
+        if not getattr(entity, 'renderable', False):
+            return None
+        if isinstance(entity, Unit):
+            return self.units_layer
+        if isinstance(entity, Building):
+            return self.buildings_layer
+        return self.resources_layer
     
     def print_debug_info(self, message):
         """Print debug info if debug is enabled."""
@@ -148,8 +221,10 @@ class Game:
         """Deselect all selected entities."""
         for entity in self.selected_entities:
             entity.deselect()
-        self.selected_entities = []
+        self.selected_entities.clear()
     
+    # Hot per-entity paths unpack camera_offset and inline these conversions
+    # rather than paying for a call each time
     def _screen_to_world(self, pos):
         """Convert screen coordinates to world coordinates."""
         return (pos[0] + self.camera_offset[0], pos[1] + self.camera_offset[1])
@@ -160,7 +235,5 @@ class Game:
     
     def _get_entity_at_position(self, pos):
         """Get entity at the given world position."""
-        for entity in reversed(self.entities):  # Reverse order to select top entities first
-            if hasattr(entity, 'rect') and entity.rect.collidepoint(pos):
-                return entity
-        return None 
\ No newline at end of file
+        return self.spatial_hash.pick(pos)
+ 
\ No newline at end of file
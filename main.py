@@ -3,11 +3,13 @@ import pygame
 import sys
 from game import Game
 from renderer import VectorRenderer
+from utils import coalesce_mouse_motion
 
 def main():
     """Main entry point for the Vector RTS game."""
-    # Initialize pygame
-    pygame.init()
+    # Initialize only the pygame subsystems the game uses (no audio or joysticks)
+    pygame.display.init()
+    freetype.init()
     
     # Set up the display
     SCREEN_WIDTH = 1200
@@ -18,18 +20,23 @@ def main():
     # Create clock for timing
     clock = pygame.time.Clock()
     
-    # Initialize game and renderer
+    # Initialize game and renderer (the renderer must be created after set_mode,
+    # since it converts its cached surfaces to the display format)
     game = Game(SCREEN_WIDTH, SCREEN_HEIGHT)
     renderer = VectorRenderer(screen)
     
     # Main game loop
     running = True
+    full_redraw = True  # Push the whole window on the first frame
     while running:
         # Calculate delta time
         dt = clock.tick(60) / 1000.0  # Convert to seconds
         
-        # Process events
-        for event in pygame.event.get():
+        # Process events, collapsing mouse motion to the latest position
+        for event in coalesce_mouse_motion(pygame.event.get()):
+            # The window contents may be lost when it is re-exposed
+            if event.type in (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE):
+                full_redraw = True
             if not game.handle_event(event):
                 running = False
         
@@ -39,8 +46,14 @@ def main():
         # Render the game
         game.render(screen, renderer)
         
-        # Update the display
-        pygame.display.flip()
+        # Update only the parts of the display drawn this frame or last frame,
+        # unless the whole window needs to be pushed
+        dirty_rects = renderer.flush_dirty_rects()
+        if full_redraw:
+            pygame.display.flip()
+            full_redraw = False
+        else:
+            pygame.display.update(dirty_rects)
     
     # Clean up
     pygame.quit()
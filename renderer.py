@@ -1,57 +1,154 @@
+import math
 import pygame
 import pygame.freetype as freetype
-from utils import WHITE, rotate_polygon
+from utils import WHITE, UNIT_SQUARE, UNIT_TRIANGLE, create_square, create_triangle
 
 class VectorRenderer:
-    """Handles vector-based rendering of game entities."""
+    """Handles vector-based rendering of game entities.
+    
+    Surfaces kept in the shape and text caches are always converted to the
+    display's pixel format first, so blitting them never needs a per-pixel
+    format conversion.
+    """
     
     def __init__(self, screen):
         """Initialize the renderer with the screen to draw on."""
         self.screen = screen
-        self.camera_offset = [0, 0]
+        self.camera_offset = pygame.math.Vector2(0, 0)
         self.font = freetype.SysFont(None, 20)  # Default font
+        self._fonts = {20: self.font}  # Font size -> loaded font
+        self._scratch4 = [[0, 0] for _ in range(4)]  # Reused vertex lists for unrotated shapes
+        self._scratch3 = [[0, 0] for _ in range(3)]
+        self._text_cache = {}  # (text, font size, color) -> (rendered Surface, text size), oldest first
+        self._shape_cache = {}  # (shape, radius, color, width, filled) -> pre-rendered Surface
+        self._dirty = []        # Screen rects drawn to this frame
+        self._prev_dirty = []   # Screen rects drawn to last frame, cleared by this frame's fill
+        self._batch = None      # Queued (draw function or None for a blit, args) while batching
     
     def set_camera_offset(self, offset):
         """Set the camera offset for rendering."""
-        self.camera_offset = offset
+        self.camera_offset = pygame.math.Vector2(offset)
+    
+    def mark_dirty(self, rect):
+        """Record a screen rect that was drawn to outside the renderer."""
+        self._dirty.append(pygame.Rect(rect))
+    
+    def flush_dirty_rects(self):
+        """Get the rects to push to the display this frame and start a new frame.
+        
+        Last frame's rects are included because the screen is cleared each frame,
+        so whatever was drawn there has to be erased on the display too.
+        """
+        rects = self._prev_dirty + self._dirty
+        self._prev_dirty = self._dirty
+        self._dirty = []
+        return rects
+    
+    def begin_batch(self):
+        """Queue draws until end_batch so runs of primitives can share one screen lock."""
+        self._batch = []
+    
+    def end_batch(self):
+        """Run the queued draws in submission order.
+        
+        The screen is locked once for each run of consecutive pygame.draw calls
+        and unlocked around blits, which cannot run on a locked surface.
+        """
+        batch, self._batch = self._batch, None
+        screen = self.screen
+        dirty = self._dirty
+        locked = False
+        try:
+            for draw_fn, args in batch:
+                if draw_fn is None:
+                    if locked:
+                        screen.unlock()
+                        locked = False
+                    dirty.append(screen.blit(*args))
+                else:
+                    if not locked:
+                        screen.lock()
+                        locked = True
+                    dirty.append(draw_fn(screen, *args))
+        finally:
+            if locked:
+                screen.unlock()
+    
+    def _draw(self, draw_fn, *args):
+        """Run a pygame.draw function on the screen, or queue it while batching."""
+        if self._batch is None:
+            self._dirty.append(draw_fn(self.screen, *args))
+        else:
+            self._batch.append((draw_fn, args))
+    
+    def _blit(self, surface, dest):
+        """Blit a surface onto the screen, or queue it while batching."""
+        if self._batch is None:
+            self._dirty.append(self.screen.blit(surface, dest))
+        else:
+            self._batch.append((None, (surface, dest)))
     
     def apply_camera_offset(self, position):
         """Apply camera offset to translate world coordinates to screen coordinates."""
         if position is None:
             return None
-        return (position[0] - self.camera_offset[0], position[1] - self.camera_offset[1])
+        # Vector2's reflected subtraction does the arithmetic in C for any 2-item sequence.
+        # pygame.draw truncates float coordinates anyway, so do it once here
+        screen_pos = position - self.camera_offset
+        return (int(screen_pos[0]), int(screen_pos[1]))
+    
+    # Circles up to this radius are drawn from cached sprites; larger ones
+    # (attack and aggro ranges) are cheaper to stroke than to blit
+    MAX_SPRITE_RADIUS = 32
     
     def draw_circle(self, center, radius, color=WHITE, width=1, filled=False):
         """Draw a circle at the given center position."""
         screen_pos = self.apply_camera_offset(center)
-        if filled:
-            pygame.draw.circle(self.screen, color, screen_pos, radius)
+        if radius <= self.MAX_SPRITE_RADIUS:
+            sprite, half = self._get_circle_sprite(radius, color, width, filled)
+            self._blit(sprite, (screen_pos[0] - half, screen_pos[1] - half))
         else:
-            pygame.draw.circle(self.screen, color, screen_pos, radius, width)
+            self._draw(pygame.draw.circle, color, screen_pos, radius, 0 if filled else width)
+    
+    def _get_circle_sprite(self, radius, color, width, filled):
+        """Get a cached circle sprite and the offset from its corner to its center."""
+        key = ("circle", radius, color, width, filled)
+        cached = self._shape_cache.get(key)
+        if cached is None:
+            half = math.ceil(radius) + 1
+            sprite = pygame.Surface((half * 2, half * 2), pygame.SRCALPHA)
+            # Drop any alpha so the sprite looks the same as drawing straight to the screen
+            pygame.draw.circle(sprite, color[:3], (half, half), radius, 0 if filled else width)
+            cached = self._shape_cache[key] = (sprite.convert_alpha(), half)
+        return cached
     
     def draw_polygon(self, points, color=WHITE, width=1, filled=False):
         """Draw a polygon defined by points."""
-        # Apply camera offset to all points
-        screen_points = [self.apply_camera_offset(point) for point in points]
+        # Apply camera offset to all points, once per polygon rather than per vertex call
+        offset_x, offset_y = self.camera_offset
+        screen_points = [(int(x - offset_x), int(y - offset_y)) for x, y in points]
         
         # Handle colors with alpha (opacity)
-        surface = None
         if len(color) > 3 and filled:
-            # Create a surface with per-pixel alpha
-            surface = pygame.Surface((self.screen.get_width(), self.screen.get_height()), pygame.SRCALPHA)
-            pygame.draw.polygon(surface, color, screen_points)
-            self.screen.blit(surface, (0, 0))
+            # Blend through a surface just big enough for the visible part of the polygon
+            xs = [x for x, _ in screen_points]
+            ys = [y for _, y in screen_points]
+            left, top = math.floor(min(xs)), math.floor(min(ys))
+            bounds = pygame.Rect(left, top, math.ceil(max(xs)) - left + 1, math.ceil(max(ys)) - top + 1)
+            bounds = bounds.clip(self.screen.get_rect())
+            if not bounds:
+                return
+            surface = pygame.Surface(bounds.size, pygame.SRCALPHA)
+            pygame.draw.polygon(surface, color, [(x - bounds.x, y - bounds.y) for x, y in screen_points])
+            self._blit(surface, bounds)
         else:
-            if filled:
-                pygame.draw.polygon(self.screen, color, screen_points)
-            else:
-                pygame.draw.polygon(self.screen, color, screen_points, width)
+            self._draw(pygame.draw.polygon, color, screen_points, 0 if filled else width)
     
     def draw_line(self, start, end, color=WHITE, width=1):
         """Draw a line from start to end position."""
         screen_start = self.apply_camera_offset(start)
         screen_end = self.apply_camera_offset(end)
-        pygame.draw.line(self.screen, color, screen_start, screen_end, width)
+        self._draw(pygame.draw.line, color, screen_start, screen_end, width)
     
     def draw_rect(self, rect, color=WHITE, width=1, filled=False):
         """Draw a rectangle."""
@@ -63,66 +160,71 @@ class VectorRenderer:
             rect.height
         )
         
-        if filled:
-            pygame.draw.rect(self.screen, color, screen_rect)
-        else:
-            pygame.draw.rect(self.screen, color, screen_rect, width)
+        self._draw(pygame.draw.rect, color, screen_rect, 0 if filled else width)
     
     def draw_square(self, center, size, color=WHITE, width=1, filled=False, angle=0):
         """Draw a square with center and size."""
-        half_size = size / 2
-        x, y = center
-        
-        points = [
-            (x - half_size, y - half_size),
-            (x + half_size, y - half_size),
-            (x + half_size, y + half_size),
-            (x - half_size, y + half_size)
-        ]
-        
-        # Rotate if necessary
         if angle != 0:
-            points = rotate_polygon(points, center, angle)
-        
-        self.draw_polygon(points, color, width, filled)
+            self.draw_polygon(create_square(center, size, angle), color, width, filled)
+        else:
+            self._draw_unrotated(self._scratch4, UNIT_SQUARE, center, size, color, width, filled)
     
     def draw_triangle(self, center, size, color=WHITE, width=1, filled=False, angle=0):
         """Draw an equilateral triangle."""
-        import math
-        x, y = center
-        height = size * math.sqrt(3) / 2  # Height of equilateral triangle
-        
-        # Create triangle pointing right by default
-        points = [
-            (x + size/2, y),
-            (x - size/2, y - height/2),
-            (x - size/2, y + height/2)
-        ]
-        
-        # Rotate if necessary
+        # Points right by default
         if angle != 0:
-            points = rotate_polygon(points, center, angle)
+            self.draw_polygon(create_triangle(center, size, angle), color, width, filled)
+        else:
+            self._draw_unrotated(self._scratch3, UNIT_TRIANGLE, center, size, color, width, filled)
+    
+    def _draw_unrotated(self, scratch, unit_points, center, size, color, width, filled):
+        """Draw an unrotated unit polygon by filling a reused vertex list in screen space."""
+        if filled and len(color) > 3:
+            # Translucent fills go through draw_polygon's blending path
+            self.draw_polygon([(center[0] + px * size, center[1] + py * size) for px, py in unit_points],
+                              color, width, filled)
+            return
         
-        self.draw_polygon(points, color, width, filled)
+        cx = center[0] - self.camera_offset[0]
+        cy = center[1] - self.camera_offset[1]
+        for point, (px, py) in zip(scratch, unit_points):
+            point[0] = int(cx + px * size)
+            point[1] = int(cy + py * size)
+        if self._batch is not None:
+            # A queued draw must not see the scratch list change under it
+            scratch = [tuple(point) for point in scratch]
+        self._draw(pygame.draw.polygon, color, scratch, 0 if filled else width)
+    
+    # Rendered strings kept between frames; labels rarely change, so this is plenty
+    MAX_CACHED_TEXTS = 256
     
     def draw_text(self, text, position, color=WHITE, font_size=20, centered=True):
         """Draw text at the given position."""
         screen_pos = self.apply_camera_offset(position)
         
-        if font_size != 20:  # Use a different font size if requested
-            font = freetype.SysFont(None, font_size)
-        else:
-            font = self.font
+        key = (text, font_size, color)
+        cached = self._text_cache.get(key)
+        if cached is None:
+            # Load each font size once and reuse it
+            font = self._fonts.get(font_size)
+            if font is None:
+                font = self._fonts[font_size] = freetype.SysFont(None, font_size)
             
-        # Create text surface using freetype
-        text_rect = font.get_rect(text)
+            # Rasterize the text once; later frames just blit it
+            text_surface, text_rect = font.render(text, color)
+            cached = (text_surface.convert_alpha(), text_rect.size)
+            if len(self._text_cache) >= self.MAX_CACHED_TEXTS:
+                del self._text_cache[next(iter(self._text_cache))]
+            self._text_cache[key] = cached
         
+        text_surface, text_size = cached
+        text_rect = pygame.Rect((0, 0), text_size)
         if centered:
             text_rect.center = screen_pos
         else:
             text_rect.topleft = screen_pos
         
-        font.render_to(self.screen, text_rect, text, color)
+        self._blit(text_surface, text_rect)
     
     def draw_selection_box(self, start, end, color=WHITE):
         """Draw a selection box from start to end positions.
@@ -140,4 +242,4 @@ class VectorRenderer:
         
         # Draw the selection box
         rect = pygame.Rect(x, y, width, height)
-        pygame.draw.rect(self.screen, color, rect, 1) 
\ No newline at end of file
+        self._draw(pygame.draw.rect, color, rect, 1) 
\ No newline at end of file
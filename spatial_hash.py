@@ -0,0 +1,144 @@
+import itertools
+
+
+class SpatialHash:
+    """Uniform grid index for fast entity hit-testing.
+
+    Each entity is stored in every cell its bounds overlap, so a point query
+    only needs to look at a single cell and a rect query at the cells the
+    rect covers. Buckets are kept sorted by the entities' Z_ORDER, topmost
+    first, so point queries can stop at the first hit.
+    """
+
+    def __init__(self, cell_size=64):
+        """Initialize an empty spatial hash.
+
+        Args:
+            cell_size: Width and height of a grid cell in world pixels
+        """
+        self.cell_size = cell_size
+        self.buckets = {}       # (cx, cy) -> list of entities, highest Z_ORDER first
+        self._entity_cells = {}  # entity -> (x0, y0, x1, y1) cell range it occupies
+        self._insert_order = {}  # entity -> insertion sequence number, for stable rect queries
+        self._next_order = itertools.count()
+
+    def __len__(self):
+        return len(self._entity_cells)
+
+    def __contains__(self, entity):
+        return entity in self._entity_cells
+
+    def __iter__(self):
+        return iter(self._entity_cells)
+
+    def _cell_range(self, entity):
+        """Get the inclusive range of cells covered by an entity."""
+        # The rect is refreshed in Entity.update before collision pushes move the
+        # position, so cover both to stay correct for rect and point tests
+        rect = entity.rect
+        half_size = entity.size / 2
+        x, y = entity.position
+        cell_size = self.cell_size
+        return (
+            int(min(rect.left, x - half_size) // cell_size),
+            int(min(rect.top, y - half_size) // cell_size),
+            int(max(rect.right, x + half_size) // cell_size),
+            int(max(rect.bottom, y + half_size) // cell_size)
+        )
+
+    def _add_to_cells(self, entity, cells):
+        z_order = entity.Z_ORDER
+        insert_order = self._insert_order
+        order = insert_order[entity]
+        x0, y0, x1, y1 = cells
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = self.buckets.get((cx, cy))
+                if bucket is None:
+                    self.buckets[(cx, cy)] = [entity]
+                    continue
+                # Insert after entities stacked above this one and after level
+                # ones inserted earlier, so re-bucketing keeps insertion order
+                index = len(bucket)
+                while index > 0:
+                    other = bucket[index - 1]
+                    if other.Z_ORDER > z_order or (other.Z_ORDER == z_order and insert_order[other] < order):
+                        break
+                    index -= 1
+                bucket.insert(index, entity)
+
+    def _remove_from_cells(self, entity, cells):
+        x0, y0, x1, y1 = cells
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = self.buckets.get((cx, cy))
+                if bucket is not None and entity in bucket:
+                    bucket.remove(entity)
+                    if not bucket:
+                        del self.buckets[(cx, cy)]
+
+    def insert(self, entity):
+        """Add an entity to the index."""
+        if entity in self._entity_cells:
+            self.update(entity)
+            return
+        cells = self._cell_range(entity)
+        self._entity_cells[entity] = cells
+        self._insert_order[entity] = next(self._next_order)
+        self._add_to_cells(entity, cells)
+
+    def remove(self, entity):
+        """Remove an entity from the index if present."""
+        cells = self._entity_cells.pop(entity, None)
+        if cells is not None:
+            del self._insert_order[entity]
+            self._remove_from_cells(entity, cells)
+
+    def update(self, entity):
+        """Re-bucket an entity, touching the grid only if its cells changed."""
+        old_cells = self._entity_cells.get(entity)
+        if old_cells is None:
+            return
+        new_cells = self._cell_range(entity)
+        if new_cells != old_cells:
+            self._remove_from_cells(entity, old_cells)
+            self._add_to_cells(entity, new_cells)
+            self._entity_cells[entity] = new_cells
+
+    def clear(self):
+        """Remove all entities from the index."""
+        self.buckets.clear()
+        self._entity_cells.clear()
+        self._insert_order.clear()
+
+    def query_point(self, pos):
+        """Get the entities whose cells contain the given point, topmost first.
+
+        The result is a candidate list; callers still do the exact hit test.
+        """
+        cell = (int(pos[0] // self.cell_size), int(pos[1] // self.cell_size))
+        return self.buckets.get(cell, ())
+
+    def pick(self, pos):
+        """Get the topmost entity containing the given point, or None."""
+        # Only the bucket for pos can hold a hit, and it is ordered topmost
+        # first so the first match wins
+        for entity in self.buckets.get((int(pos[0] // self.cell_size), int(pos[1] // self.cell_size)), ()):
+            if entity.contains_point(pos):
+                return entity
+        return None
+
+    def query_rect(self, rect):
+        """Get the entities whose cells overlap the given pygame.Rect.
+
+        The result is a list in insertion order, so callers see entities in the
+        same order as the entity list they were added from.
+        """
+        cell_size = self.cell_size
+        candidates = set()
+        for cx in range(int(rect.left // cell_size), int(rect.right // cell_size) + 1):
+            for cy in range(int(rect.top // cell_size), int(rect.bottom // cell_size) + 1):
+                bucket = self.buckets.get((cx, cy))
+                if bucket:
+                    candidates.update(bucket)
+        return sorted(candidates, key=self._insert_order.__getitem__)
@@ -26,6 +26,7 @@ class TestEntity:
         assert entity.size == size
         assert entity.color == color
         assert entity.selected == False
+        assert entity.player_id is None  # Neutral until a subclass assigns an owner
         assert isinstance(entity.rect, pygame.Rect)
         assert entity.rect.x == position[0] - size/2
         assert entity.rect.y == position[1] - size/2
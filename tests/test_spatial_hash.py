@@ -0,0 +1,130 @@
+import sys
+import os
+import pygame
+import pytest
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from entities import Entity, Resource, Unit, Building
+from spatial_hash import SpatialHash
+
+
+class TestSpatialHash:
+    """Tests for the SpatialHash entity index."""
+
+    def test_insert_and_query_point(self):
+        """Test that point queries return entities in the containing cell."""
+        grid = SpatialHash(cell_size=64)
+        near = Entity([100, 100], 20)
+        far = Entity([500, 500], 20)
+        grid.insert(near)
+        grid.insert(far)
+
+        assert near in grid.query_point((100, 100))
+        assert far not in grid.query_point((100, 100))
+        assert len(grid) == 2
+
+    def test_entity_spanning_cells(self):
+        """Test that an entity overlapping a cell border is found from both cells."""
+        grid = SpatialHash(cell_size=64)
+        entity = Entity([64, 64], 20)
+        grid.insert(entity)
+
+        assert entity in grid.query_point((58, 58))
+        assert entity in grid.query_point((70, 70))
+
+    def test_point_query_is_z_ordered(self):
+        """Test that buckets list buildings above units above resources."""
+        grid = SpatialHash(cell_size=64)
+        resource = Resource([30, 30])
+        unit = Unit([30, 30], 15, (0, 0, 255), 50, 100, 0)
+        building = Building([30, 30], 40, (0, 0, 255), 500, 0)
+        second_unit = Unit([30, 30], 15, (0, 0, 255), 50, 100, 0)
+        for entity in (resource, unit, building, second_unit):
+            grid.insert(entity)
+
+        assert list(grid.query_point((30, 30))) == [building, unit, second_unit, resource]
+
+    def test_pick_returns_topmost_hit(self):
+        """Test that pick returns the topmost entity under the point, or None."""
+        grid = SpatialHash(cell_size=64)
+        resource = Resource([30, 30])
+        building = Building([30, 30], 40, (0, 0, 255), 500, 0)
+        grid.insert(resource)
+        grid.insert(building)
+
+        assert grid.pick((30, 30)) is building
+        assert grid.pick((60, 60)) is None
+        assert grid.pick((900, 900)) is None
+
+    def test_rebucketed_entity_keeps_insertion_order(self):
+        """Test that moving an entity out of its cell and back keeps same-tier order."""
+        grid = SpatialHash(cell_size=64)
+        first = Unit([30, 30], 15, (0, 0, 255), 50, 100, 0)
+        second = Unit([30, 30], 15, (0, 0, 255), 50, 100, 0)
+        grid.insert(first)
+        grid.insert(second)
+
+        for pos in ([300, 300], [30, 30]):
+            first.position = pos
+            first.rect.center = pos
+            grid.update(first)
+
+        assert list(grid.query_point((30, 30))) == [first, second]
+        assert grid.pick((30, 30)) is first
+
+    def test_query_rect(self):
+        """Test that rect queries return entities in all covered cells."""
+        grid = SpatialHash(cell_size=64)
+        inside = [Entity([x, 50], 10) for x in (20, 150, 280)]
+        outside = Entity([1000, 1000], 10)
+        for entity in inside + [outside]:
+            grid.insert(entity)
+
+        found = grid.query_rect(pygame.Rect(0, 0, 300, 100))
+
+        assert found == inside
+        assert outside not in found
+
+    def test_query_rect_keeps_insertion_order(self):
+        """Test that rect queries list entities in the order they were inserted."""
+        grid = SpatialHash(cell_size=64)
+        entities = [Entity([x, 50], 10) for x in (280, 20, 150, 90)]
+        for entity in entities:
+            grid.insert(entity)
+
+        assert grid.query_rect(pygame.Rect(0, 0, 300, 100)) == entities
+
+    def test_update_rebuckets_moved_entity(self):
+        """Test that moving an entity updates the cells it is stored in."""
+        grid = SpatialHash(cell_size=64)
+        entity = Entity([10, 10], 10)
+        grid.insert(entity)
+
+        entity.position = [300, 300]
+        entity.rect.center = (300, 300)
+        grid.update(entity)
+
+        assert entity not in grid.query_point((10, 10))
+        assert entity in grid.query_point((300, 300))
+
+    def test_remove_and_clear(self):
+        """Test that removed entities are no longer returned."""
+        grid = SpatialHash(cell_size=64)
+        first = Entity([10, 10], 10)
+        second = Entity([20, 20], 10)
+        grid.insert(first)
+        grid.insert(second)
+
+        grid.remove(first)
+        assert first not in grid.query_point((10, 10))
+        assert first not in grid
+        assert list(grid) == [second]
+
+        # Removing twice is a no-op
+        grid.remove(first)
+
+        grid.clear()
+        assert len(grid) == 0
+        assert not grid.buckets
@@ -0,0 +1,121 @@
+import sys
+import os
+import math
+import numpy as np
+import pygame
+import pytest
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import (
+    GREEN, RED, UNIT_HEXAGON, UNIT_PENTAGON, UNIT_SQUARE, UNIT_TRIANGLE, WHITE, angle_between,
+    coalesce_mouse_motion, create_square, create_triangle, dash_segments, distance, distance_sq,
+    draw_health_bar, normalize, rotate_polygon, transform_polygons
+)
+
+
+class TestCoalesceMouseMotion:
+    """Tests for collapsing mouse motion events."""
+
+    def test_keeps_only_last_motion(self):
+        """Test that only the final motion event survives, in its original place."""
+        down = pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=1, pos=(0, 0))
+        motions = [pygame.event.Event(pygame.MOUSEMOTION, pos=(i, i)) for i in range(3)]
+        up = pygame.event.Event(pygame.MOUSEBUTTONUP, button=1, pos=(5, 5))
+
+        events = [motions[0], down, motions[1], up, motions[2]]
+
+        assert coalesce_mouse_motion(events) == [down, up, motions[2]]
+
+    def test_no_motion_events(self):
+        """Test that batches without motion are returned unchanged."""
+        key = pygame.event.Event(pygame.KEYDOWN, key=pygame.K_a)
+
+        assert coalesce_mouse_motion([key]) == [key]
+        assert coalesce_mouse_motion([]) == []
+
+
+class TestVectorHelpers:
+    """Tests for the scalar vector helpers."""
+
+    def test_distance_and_angle(self):
+        """Test distance and angle between two positions."""
+        assert distance((1, 2), [4, 6]) == 5
+        assert distance_sq((1, 2), [4, 6]) == 25
+        assert angle_between((0, 0), (0, 3)) == pytest.approx(math.pi / 2)
+
+    def test_normalize(self):
+        """Test normalizing a vector, including the zero vector."""
+        assert normalize((3, 4)) == pytest.approx((0.6, 0.8))
+        assert normalize((0, 0)) == (0, 0)
+
+
+class TestPolygonHelpers:
+    """Tests for the cached-rotation polygon builders."""
+
+    def test_unrotated_square(self):
+        """Test that an unrotated square has exact corners."""
+        assert create_square((10, 10), 4) == [(8, 8), (12, 8), (12, 12), (8, 12)]
+
+    def test_rotated_shapes_match_rotate_polygon(self):
+        """Test that rotated shapes match rotating the unrotated points."""
+        for angle in (0.3, math.pi / 2, -2.0, 7.5):
+            for create in (create_square, create_triangle):
+                expected = rotate_polygon(create((50, 20), 16), (50, 20), angle)
+                for (x, y), (ex, ey) in zip(create((50, 20), 16, angle), expected):
+                    assert x == pytest.approx(ex, abs=0.02)
+                    assert y == pytest.approx(ey, abs=0.02)
+
+        # Points may also be given as an (N, 2) array
+        points = create_square((50, 20), 16)
+        for angle in (0, 0.3):
+            assert rotate_polygon(np.array(points), (50, 20), angle) == rotate_polygon(points, (50, 20), angle)
+        assert rotate_polygon(np.empty((0, 2)), (50, 20), 0.3) == []
+
+    def test_transform_polygons_matches_single_shapes(self):
+        """Test that bulk-built polygons match building each shape on its own."""
+        centers = [(0, 0), (50, 20), (-30, 75)]
+        sizes = [10, 16, 22]
+        angles = [0, 0.3, -2.0]
+        for unit_points, create in ((UNIT_SQUARE, create_square), (UNIT_TRIANGLE, create_triangle)):
+            vertices = transform_polygons(unit_points, centers, sizes, angles)
+            assert vertices.shape == (3, len(unit_points), 2)
+            for shape, center, size, angle in zip(vertices.tolist(), centers, sizes, angles):
+                for (x, y), (ex, ey) in zip(shape, create(center, size, angle)):
+                    assert x == pytest.approx(ex, abs=0.02)
+                    assert y == pytest.approx(ey, abs=0.02)
+
+    def test_unit_regular_polygons(self):
+        """Test that the unit pentagon and hexagon are regular with unit diameter."""
+        assert UNIT_PENTAGON[0] == pytest.approx((0, -0.5))
+        assert UNIT_HEXAGON[0] == pytest.approx((0.5, 0))
+        for unit_points in (UNIT_PENTAGON, UNIT_HEXAGON):
+            for x, y in unit_points:
+                assert math.hypot(x, y) == pytest.approx(0.5)
+
+    def test_dash_segments(self):
+        """Test that dashes repeat along the line and the last one stops at the end."""
+        segments = dash_segments((10, 5), (10, 40), 10, 5)
+
+        assert segments.tolist() == [[10, 5, 10, 15], [10, 20, 10, 30], [10, 35, 10, 40]]
+        assert dash_segments((3, 3), (3, 3), 10, 5).shape == (0, 4)
+
+
+class TestDrawHealthBar:
+    """Tests for the health bar helper."""
+
+    def test_full_bar_matches_drawn_bar(self):
+        """Test that the cached full bar looks the same as drawing all three rects."""
+        cached = pygame.Surface((60, 20))
+        drawn = pygame.Surface((60, 20))
+        for surface in (cached, drawn):
+            surface.fill((0, 0, 0))
+
+        draw_health_bar(cached, (5.5, 4), (33.6, 5), 100, 100)
+        # Drawn a second time to go through the cache hit path
+        draw_health_bar(cached, (5.5, 4), (33.6, 5), 100, 100)
+        for color, width in ((RED, 0), (GREEN, 0), (WHITE, 1)):
+            pygame.draw.rect(drawn, color, (5.5, 4, 33.6, 5), width)
+
+        assert pygame.image.tobytes(cached, "RGB") == pygame.image.tobytes(drawn, "RGB")
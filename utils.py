@@ -1,4 +1,5 @@
 import math
+import functools
 import pygame
 import numpy as np
 
@@ -14,20 +15,24 @@ CYAN = (0, 255, 255)
 # Vector operations
 def normalize(vector):
     """Normalize a vector to unit length."""
-    magnitude = math.sqrt(vector[0]**2 + vector[1]**2)
+    magnitude = math.hypot(vector[0], vector[1])
     if magnitude == 0:
         return (0, 0)
     return (vector[0] / magnitude, vector[1] / magnitude)
 
 def distance(pos1, pos2):
     """Calculate Euclidean distance between two positions."""
-    return math.sqrt((pos1[0] - pos2[0])**2 + (pos1[1] - pos2[1])**2)
+    return math.hypot(pos1[0] - pos2[0], pos1[1] - pos2[1])
+
+def distance_sq(pos1, pos2):
+    """Calculate squared distance between two positions, for comparing against squared thresholds."""
+    dx = pos1[0] - pos2[0]
+    dy = pos1[1] - pos2[1]
+    return dx * dx + dy * dy
 
 def angle_between(pos1, pos2):
     """Calculate angle in radians between two positions."""
-    dx = pos2[0] - pos1[0]
-    dy = pos2[1] - pos1[1]
-    return math.atan2(dy, dx)
+    return math.atan2(pos2[1] - pos1[1], pos2[0] - pos1[0])
 
 def rotate_point(point, center, angle):
     """Rotate a point around a center by angle (radians)."""
@@ -49,42 +54,108 @@ def rotate_point(point, center, angle):
 
 def rotate_polygon(points, center, angle):
     """Rotate all points in a polygon around a center by angle (radians)."""
-    return [rotate_point(point, center, angle) for point in points]
+    if angle == 0 or len(points) == 0:
+        return [tuple(point) for point in points]
+    
+    # One rotation matrix for the whole polygon instead of trig per vertex
+    cos_a = math.cos(angle)
+    sin_a = math.sin(angle)
+    rotation = np.array([[cos_a, sin_a], [-sin_a, cos_a]])  # Transposed for row vectors
+    center = np.asarray(center, dtype=float)
+    rotated = (np.asarray(points, dtype=float) - center) @ rotation + center
+    return list(map(tuple, rotated.tolist()))
 
-def create_square(center, size, angle=0):
-    """Create a square centered at center with side length size, rotated by angle (radians)."""
-    half_size = size / 2
-    x, y = center
-    points = [
-        (x - half_size, y - half_size),
-        (x + half_size, y - half_size),
-        (x + half_size, y + half_size),
-        (x - half_size, y + half_size)
-    ]
+# Unit-size polygons, scaled, rotated and translated by create_square/create_triangle
+UNIT_SQUARE = ((-0.5, -0.5), (0.5, -0.5), (0.5, 0.5), (-0.5, 0.5))
+_SQRT3_OVER_2 = math.sqrt(3) / 2  # Height of an equilateral triangle with unit sides
+UNIT_TRIANGLE = ((0.5, 0.0), (-0.5, -_SQRT3_OVER_2 / 2), (-0.5, _SQRT3_OVER_2 / 2))  # Pointing right
+
+# Unit-size regular polygons for the building outlines, scaled and translated by callers
+UNIT_PENTAGON = tuple((0.5 * math.cos(math.tau / 5 * i - math.pi / 2),
+                       0.5 * math.sin(math.tau / 5 * i - math.pi / 2)) for i in range(5))  # Pointing up
+UNIT_HEXAGON = tuple((0.5 * math.cos(math.pi / 3 * i), 0.5 * math.sin(math.pi / 3 * i)) for i in range(6))
+
+_ANGLE_STEPS = 1024  # Cached (cos, sin) pairs per radian
+
+@functools.lru_cache(maxsize=4096)
+def _cossin_step(step):
+    """Get (cos, sin) for a quantized angle step."""
+    angle = step / _ANGLE_STEPS
+    return math.cos(angle), math.sin(angle)
+
+def _cossin(angle):
+    """Get (cos, sin) of angle (radians), quantized so repeated facings hit the cache."""
+    return _cossin_step(round((angle % math.tau) * _ANGLE_STEPS))
+
+def _transform_polygon(unit_points, center, size, angle):
+    """Scale unit_points by size, rotate by angle (radians) and move them to center."""
+    cx, cy = center
+    if angle == 0:
+        return [(cx + px * size, cy + py * size) for px, py in unit_points]
+    cos_a, sin_a = _cossin(angle)
+    cos_a *= size
+    sin_a *= size
+    return [(cx + px * cos_a - py * sin_a, cy + px * sin_a + py * cos_a) for px, py in unit_points]
+
+def transform_polygons(unit_points, centers, sizes, angles):
+    """Scale, rotate and translate one unit polygon for many shapes in a single NumPy pass.
+    
+    Args:
+        unit_points: Unit polygon vertices, e.g. UNIT_SQUARE
+        centers: Sequence of N (x, y) polygon centers
+        sizes: Sequence of N polygon sizes
+        angles: Sequence of N rotation angles (radians)
     
-    # Rotate if needed
-    if angle != 0:
-        points = rotate_polygon(points, center, angle)
+    Returns:
+        (N, len(unit_points), 2) array of vertices
+    """
+    unit = np.asarray(unit_points, dtype=float)
+    centers = np.asarray(centers, dtype=float).reshape(-1, 1, 2)
+    sizes = np.asarray(sizes, dtype=float)
+    angles = np.asarray(angles, dtype=float)
+    cos_a = (np.cos(angles) * sizes)[:, None]
+    sin_a = (np.sin(angles) * sizes)[:, None]
     
-    return points
+    vertices = np.empty((len(angles), len(unit), 2))
+    vertices[:, :, 0] = unit[:, 0] * cos_a - unit[:, 1] * sin_a
+    vertices[:, :, 1] = unit[:, 0] * sin_a + unit[:, 1] * cos_a
+    vertices += centers
+    return vertices
 
-def create_triangle(center, size, angle=0):
-    """Create an equilateral triangle centered at center with side length size."""
-    x, y = center
-    height = size * math.sqrt(3) / 2  # Height of equilateral triangle
+def dash_segments(start, end, dash_length, gap_length):
+    """Get the segments of a dashed line from start to end in a single NumPy pass.
     
-    # Create triangle pointing right
-    points = [
-        (x + size/2, y),
-        (x - size/2, y - height/2),
-        (x - size/2, y + height/2)
-    ]
+    Args:
+        start: (x, y) start of the line
+        end: (x, y) end of the line
+        dash_length: Length of each dash
+        gap_length: Length of the gap after each dash
     
-    # Rotate if needed
-    if angle != 0:
-        points = rotate_polygon(points, center, angle)
+    Returns:
+        (N, 4) array of (x0, y0, x1, y1) dashes; the last dash is cut at end
+    """
+    dx = end[0] - start[0]
+    dy = end[1] - start[1]
+    dist = math.hypot(dx, dy)
+    if dist == 0:
+        return np.empty((0, 4))
     
-    return points
+    offsets = np.arange(0, dist, dash_length + gap_length)
+    direction = np.array((dx, dy)) / dist
+    segments = np.empty((len(offsets), 4))
+    segments[:, :2] = offsets[:, None] * direction
+    segments[:, 2:] = np.minimum(offsets + dash_length, dist)[:, None] * direction
+    segments[:, :2] += start
+    segments[:, 2:] += start
+    return segments
+
+def create_square(center, size, angle=0):
+    """Create a square centered at center with side length size, rotated by angle (radians)."""
+    return _transform_polygon(UNIT_SQUARE, center, size, angle)
+
+def create_triangle(center, size, angle=0):
+    """Create an equilateral triangle centered at center with side length size."""
+    return _transform_polygon(UNIT_TRIANGLE, center, size, angle)
 
 # Game utility functions
 def is_point_in_rect(point, rect):
@@ -99,11 +170,41 @@ def is_rect_colliding_rect(rect1, rect2):
     """Check if rect1 is colliding with rect2."""
     return rect1.colliderect(rect2)
 
+def coalesce_mouse_motion(events):
+    """Drop all but the last MOUSEMOTION event from a batch of events.
+    
+    Only the final cursor position matters for a frame, so intermediate motion
+    events are skipped instead of being dispatched one by one.
+    """
+    last_motion = None
+    for i, event in enumerate(events):
+        if event.type == pygame.MOUSEMOTION:
+            last_motion = i
+    
+    if last_motion is None:
+        return events
+    return [event for i, event in enumerate(events)
+            if event.type != pygame.MOUSEMOTION or i == last_motion]
+
+_healthbar_cache = {}  # ((width, height), color) -> pre-drawn full health bar Surface
+
 def draw_health_bar(surface, position, size, value, max_value, color=GREEN, bg_color=RED):
     """Draw a health bar at the specified position."""
     x, y = position
     width, height = size
     
+    # A full bar hides the background entirely, so blit a cached fill and border
+    if value >= max_value:
+        bar_rect = pygame.Rect(x, y, width, height)
+        key = (bar_rect.size, color)
+        bar = _healthbar_cache.get(key)
+        if bar is None:
+            bar = pygame.Surface(bar_rect.size, 0, surface)  # Same pixel format as the target
+            bar.fill(color)
+            pygame.draw.rect(bar, WHITE, bar.get_rect(), 1)
+            _healthbar_cache[key] = bar
+        return surface.blit(bar, bar_rect)
+    
     # Calculate fill width based on health percentage
     fill_width = (value / max_value) * width
     
@@ -115,4 +216,4 @@ def draw_health_bar(surface, position, size, value, max_value, color=GREEN, bg_c
         pygame.draw.rect(surface, color, (x, y, fill_width, height))
     
     # Draw border
-    pygame.draw.rect(surface, WHITE, (x, y, width, height), 1) 
\ No newline at end of file
+    return pygame.draw.rect(surface, WHITE, (x, y, width, height), 1)
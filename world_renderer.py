@@ -1,7 +1,14 @@
 import pygame
-from entities import Building, Unit
-from utils import WHITE
+from utils import WHITE, UNIT_HEXAGON, UNIT_PENTAGON, dash_segments, distance_sq
 import math
+import numpy as np
+
+# Extra world-space margin around an entity's size that its health bar and
+# labels can reach; anything further out is skipped when off screen
+CULL_MARGIN = 40
+
+# Attack range drawn around the turret placement preview
+TURRET_PREVIEW_RANGE = 150
 
 class WorldRenderer:
     """Handles rendering of world entities and effects."""
@@ -13,6 +20,9 @@ class WorldRenderer:
             game: Reference to the main Game instance
         """
         self.game = game
+        self._preview_cache = {}  # (build_type, valid_placement) -> preview surface
+        self._status_cache = {}  # valid_placement -> status text surface
+        self._reticle = None  # Attack-move cursor surface
     
     def render(self, screen, renderer, dt=None):
         """Render the game world.
@@ -27,44 +37,48 @@ class WorldRenderer:
             dt = 0
             
         # Set clipping rect to exclude UI area
-        screen.set_clip(0, 0, self.game.screen_width, self.game.screen_height - self.game.ui_panel_height)
+        screen.set_clip(self.game.world_clip)
         
-        # Clear screen
-        screen.fill((20, 20, 20))  # Very dark gray background
+        # Clear the world area
+        screen.fill((20, 20, 20), self.game.world_clip)  # Very dark gray background
         
         # Draw grid
-        self._render_world_grid(screen, renderer)
-        
-        # Render all entities (sorted by type to control rendering order)
-        all_entities = self.game.entities
-        
-        # Render resources first (bottom layer)
-        for entity in [e for e in all_entities if hasattr(e, 'render') and not isinstance(e, Building) and not isinstance(e, Unit)]:
-            entity.render(renderer)
-        
-        # Render buildings next (middle layer)
-        for entity in [e for e in all_entities if hasattr(e, 'render') and isinstance(e, Building)]:
-            entity.render(renderer)
-            
-        # Render units last (top layer)
-        for entity in [e for e in all_entities if hasattr(e, 'render') and isinstance(e, Unit)]:
-            entity.render(renderer)
+        if self.game.show_grid:
+            self._render_world_grid(screen, renderer)
+        
+        # Visible world rect; debug overlays can reach anywhere, so don't cull then
+        cull = not self.game.show_debug
+        view_left, view_top = self.game.camera_offset
+        view_right = view_left + self.game.screen_width
+        view_bottom = view_top + self.game.world_bottom
+        
+        # Draw the layers bottom to top: resources, then buildings, then units
+        for layer in (self.game.resources_layer, self.game.buildings_layer, self.game.units_layer):
+            for entity in layer:
+                # Selected entities may draw range circles, so always keep them
+                if cull and not entity.selected:
+                    x, y = entity.position
+                    reach = entity.size + CULL_MARGIN
+                    if (x + reach < view_left or x - reach > view_right or
+                            y + reach < view_top or y - reach > view_bottom):
+                        continue
+                entity.render(renderer)
         
         # Draw selection box if selecting
         if self.game.is_selecting and self.game.selection_start and self.game.selection_end:
             renderer.draw_selection_box(self.game.selection_start, self.game.selection_end, (255, 255, 255))
         
-        # Render building placement preview if in build mode
-        if self.game.build_mode and self.game.build_type:
+        # Cursor overlays are only drawn while the mouse is over the world
+        if self.game.build_mode or self.game.attack_move_mode:
             mouse_pos = pygame.mouse.get_pos()
-            if mouse_pos[1] < self.game.screen_height - self.game.ui_panel_height:
-                self._render_building_preview(screen, renderer, mouse_pos)
-        
-        # Render attack-move cursor if in attack-move mode
-        if self.game.attack_move_mode:
-            mouse_pos = pygame.mouse.get_pos()
-            if mouse_pos[1] < self.game.screen_height - self.game.ui_panel_height:
-                self._render_attack_move_cursor(screen, renderer, mouse_pos)
+            if mouse_pos[1] < self.game.world_bottom:
+                # Render building placement preview if in build mode
+                if self.game.build_mode and self.game.build_type:
+                    self._render_building_preview(screen, renderer, mouse_pos)
+                
+                # Render attack-move cursor if in attack-move mode
+                if self.game.attack_move_mode:
+                    self._render_attack_move_cursor(screen, renderer, mouse_pos)
                 
         # Render patrol line if active
         if self.game.show_patrol_line and self.game.patrol_start and self.game.patrol_end:
@@ -88,24 +102,29 @@ class WorldRenderer:
         grid_size = 200  # Size of grid cells
         grid_color = (30, 30, 30)  # Very dark gray
         
-        # Calculate visible grid range
-        start_x = (self.game.camera_offset[0] // grid_size) * grid_size
+        # Calculate visible grid range, snapped to whole cells as ints
+        cam_x, cam_y = self.game.camera_offset
+        start_x = int(cam_x // grid_size) * grid_size
         end_x = start_x + self.game.screen_width + grid_size
         
-        start_y = (self.game.camera_offset[1] // grid_size) * grid_size
+        start_y = int(cam_y // grid_size) * grid_size
         end_y = start_y + self.game.screen_height + grid_size
         
+        # The grid extents are the same for every line, so transform them once
+        screen_start_x = start_x - cam_x
+        screen_end_x = end_x - cam_x
+        screen_start_y = start_y - cam_y
+        screen_end_y = end_y - cam_y
+        
         # Draw vertical grid lines
-        for x in range(int(start_x), int(end_x), grid_size):
-            start_pos = self.game._world_to_screen([x, start_y])
-            end_pos = self.game._world_to_screen([x, end_y])
-            pygame.draw.line(screen, grid_color, start_pos, end_pos, 1)
+        screen_xs = (np.arange(start_x, end_x, grid_size) - cam_x).tolist()
+        for screen_x in screen_xs:
+            pygame.draw.line(screen, grid_color, (screen_x, screen_start_y), (screen_x, screen_end_y), 1)
         
         # Draw horizontal grid lines
-        for y in range(int(start_y), int(end_y), grid_size):
-            start_pos = self.game._world_to_screen([start_x, y])
-            end_pos = self.game._world_to_screen([end_x, y])
-            pygame.draw.line(screen, grid_color, start_pos, end_pos, 1)
+        screen_ys = (np.arange(start_y, end_y, grid_size) - cam_y).tolist()
+        for screen_y in screen_ys:
+            pygame.draw.line(screen, grid_color, (screen_start_x, screen_y), (screen_end_x, screen_y), 1)
     
     def _render_building_preview(self, screen, renderer, pos):
         """Render a preview of the building that's about to be placed.
@@ -118,54 +137,99 @@ class WorldRenderer:
         # Apply camera offset to get world position
         world_pos = self.game._screen_to_world(pos)
         
-        # Check for valid placement
+        # Check for valid placement; an entity centred within range always
+        # has its centre cell in the rect around world_pos
         valid_placement = True
-        for entity in self.game.entities:
-            if hasattr(entity, 'position') and hasattr(entity, 'position'):
-                if self._distance(world_pos, entity.position) < 70:
-                    valid_placement = False
-                    break
+        nearby = self.game.spatial_hash.query_rect(pygame.Rect(world_pos[0] - 70, world_pos[1] - 70, 140, 140))
+        for entity in nearby:
+            if distance_sq(world_pos, entity.position) < 70 * 70:
+                valid_placement = False
+                break
         
-        # Determine building size and type
+        # Determine building size and draw the cached preview centred on the mouse
         size = 0
         if self.game.build_type == "unit_building":
             size = 60  # UnitBuilding size
-            # Create preview surface
-            preview_surface = pygame.Surface((self.game.screen_width, self.game.screen_height), pygame.SRCALPHA)
+        elif self.game.build_type == "turret":
+            size = 40  # Turret size
+        
+        if size:
+            preview_surface = self._get_preview_surface(self.game.build_type, size, valid_placement)
+            half = preview_surface.get_width() // 2
+            screen.blit(preview_surface, (pos[0] - half, pos[1] - half))
+        
+        # Draw placement status text on its background, centred above the preview
+        status_surface, (offset_x, offset_y) = self._get_status_surface(valid_placement)
+        screen.blit(status_surface, (pos[0] + offset_x, pos[1] - size - 20 + offset_y))
+    
+    def _get_status_surface(self, valid_placement):
+        """Get the cached placement status text on its black background.
+        
+        Args:
+            valid_placement: Whether the location is valid
+            
+        Returns:
+            tuple: (surface, offset) where offset places the text centred on a point
+        """
+        cached = self._status_cache.get(valid_placement)
+        if cached is not None:
+            return cached
+        
+        status_text = "Valid Location" if valid_placement else "Cannot Build Here"
+        status_color = (0, 255, 0) if valid_placement else (255, 0, 0)
+        
+        # Render the text over a background grown by (10, 5) as Rect.inflate would
+        text_rect = self.game.font_small.get_rect(status_text)
+        status_surface = pygame.Surface((text_rect.width + 10, text_rect.height + 5))
+        status_surface.fill((0, 0, 0))
+        self.game.font_small.render_to(status_surface, (5, 2), status_text, status_color)
+        
+        # Centre the text itself, matching Rect.center on the text rect
+        offset = (-(text_rect.width // 2) - 5, -(text_rect.height // 2) - 2)
+        cached = (status_surface.convert(), offset)
+        self._status_cache[valid_placement] = cached
+        return cached
+    
+    def _get_preview_surface(self, build_type, size, valid_placement):
+        """Get the cached preview of a building type, drawn on first use.
+        
+        Args:
+            build_type: "unit_building" or "turret"
+            size: Size of the building
+            valid_placement: Whether the preview shows a valid location
+            
+        Returns:
+            pygame.Surface: Square preview surface with the building at its centre
+        """
+        key = (build_type, valid_placement)
+        preview_surface = self._preview_cache.get(key)
+        if preview_surface is not None:
+            return preview_surface
+        
+        color = (100, 100, 255) if valid_placement else (255, 100, 100)
+        
+        if build_type == "unit_building":
+            # Leave room for the 2px outline
+            half = size // 2 + 2
+            preview_surface = pygame.Surface((half * 2, half * 2), pygame.SRCALPHA)
+            pos = (half, half)
             
             # Draw a pentagon for unit building
-            points = []
-            for i in range(5):
-                angle = 2*math.pi/5 * i - math.pi/2  # Start from top
-                x = pos[0] + math.cos(angle) * size/2
-                y = pos[1] + math.sin(angle) * size/2
-                points.append((x, y))
-                
-            color = (100, 100, 255) if valid_placement else (255, 100, 100)
+            points = [(pos[0] + ux * size, pos[1] + uy * size) for ux, uy in UNIT_PENTAGON]
             
             # Draw the pentagon body
             pygame.draw.polygon(preview_surface, (*color, 128), points)
             
             # Draw the outline
             pygame.draw.polygon(preview_surface, (255, 255, 255, 200), points, 2)
-            
-            # Blit the entire preview
-            screen.blit(preview_surface, (0, 0))
-            
-        elif self.game.build_type == "turret":
-            size = 40  # Turret size
-            # Create preview surface
-            preview_surface = pygame.Surface((self.game.screen_width, self.game.screen_height), pygame.SRCALPHA)
+        else:
+            # Leave room for the turret range circle
+            half = TURRET_PREVIEW_RANGE + 2
+            preview_surface = pygame.Surface((half * 2, half * 2), pygame.SRCALPHA)
+            pos = (half, half)
             
             # Draw a hexagon for turret
-            points = []
-            for i in range(6):
-                angle = math.pi/3 * i
-                x = pos[0] + math.cos(angle) * size/2
-                y = pos[1] + math.sin(angle) * size/2
-                points.append((x, y))
-                
-            color = (100, 100, 255) if valid_placement else (255, 100, 100)
+            points = [(pos[0] + ux * size, pos[1] + uy * size) for ux, uy in UNIT_HEXAGON]
             
             # Draw the hexagon body
             pygame.draw.polygon(preview_surface, (*color, 128), points)
@@ -175,29 +239,15 @@ class WorldRenderer:
             pygame.draw.line(preview_surface, (255, 255, 255, 180), pos, (pos[0] + barrel_length, pos[1]), 3)
             
             # Draw range circle
-            pygame.draw.circle(preview_surface, (255, 255, 255, 30), pos, 150)  # Turret range
-            pygame.draw.circle(preview_surface, (255, 255, 255, 60), pos, 150, 1)
+            pygame.draw.circle(preview_surface, (255, 255, 255, 30), pos, TURRET_PREVIEW_RANGE)
+            pygame.draw.circle(preview_surface, (255, 255, 255, 60), pos, TURRET_PREVIEW_RANGE, 1)
             
             # Draw the outline
             pygame.draw.polygon(preview_surface, (255, 255, 255, 200), points, 2)
-            
-            # Blit the entire preview
-            screen.blit(preview_surface, (0, 0))
         
-        # Draw placement status text
-        status_text = "Valid Location" if valid_placement else "Cannot Build Here"
-        status_color = (0, 255, 0) if valid_placement else (255, 0, 0)
-        
-        # Create a background for the text
-        text_rect = self.game.font_small.get_rect(status_text)
-        text_rect.center = (pos[0], pos[1] - size - 20)
-        
-        bg_rect = pygame.Rect(text_rect)
-        bg_rect.inflate_ip(10, 5)
-        pygame.draw.rect(screen, (0, 0, 0), bg_rect)
-        
-        # Draw the text
-        self.game.font_small.render_to(screen, text_rect, status_text, status_color)
+        preview_surface = preview_surface.convert_alpha()
+        self._preview_cache[key] = preview_surface
+        return preview_surface
     
     def _render_attack_move_cursor(self, screen, renderer, pos):
         """Render a custom cursor for attack-move mode.
@@ -207,10 +257,14 @@ class WorldRenderer:
             renderer: The vector renderer instance
             pos: Mouse position on screen
         """
-        # Draw a red targeting reticle
-        pygame.draw.circle(screen, (255, 0, 0), pos, 15, 2)
-        pygame.draw.line(screen, (255, 0, 0), (pos[0] - 20, pos[1]), (pos[0] + 20, pos[1]), 2)
-        pygame.draw.line(screen, (255, 0, 0), (pos[0], pos[1] - 20), (pos[0], pos[1] + 20), 2)
+        # Draw a red targeting reticle, pre-drawn on first use
+        if self._reticle is None:
+            reticle = pygame.Surface((44, 44), pygame.SRCALPHA)
+            pygame.draw.circle(reticle, (255, 0, 0), (22, 22), 15, 2)
+            pygame.draw.line(reticle, (255, 0, 0), (2, 22), (42, 22), 2)
+            pygame.draw.line(reticle, (255, 0, 0), (22, 2), (22, 42), 2)
+            self._reticle = reticle.convert_alpha()
+        screen.blit(self._reticle, (pos[0] - 22, pos[1] - 22))
     
     def _render_patrol_line(self, screen, renderer):
         """Render a line indicating the patrol route.
@@ -235,7 +289,7 @@ class WorldRenderer:
         # Calculate the total distance and angle
         dx = end_screen[0] - start_screen[0]
         dy = end_screen[1] - start_screen[1]
-        dist = self._distance(start_screen, end_screen)
+        dist = math.hypot(dx, dy)
         
         if dist == 0:
             return
@@ -245,58 +299,26 @@ class WorldRenderer:
         dy /= dist
         
         # Draw dashes
-        pos = start_screen
-        current_length = 0
-        drawing = True
-        
-        while current_length < dist:
-            if drawing:
-                dash_end = (
-                    pos[0] + dx * min(dash_length, dist - current_length),
-                    pos[1] + dy * min(dash_length, dist - current_length)
-                )
-                pygame.draw.line(screen, dash_color, pos, dash_end, 2)
-                pos = dash_end
-                current_length += dash_length
-                drawing = False
-            else:
-                pos = (
-                    pos[0] + dx * min(gap_length, dist - current_length),
-                    pos[1] + dy * min(gap_length, dist - current_length)
-                )
-                current_length += gap_length
-                drawing = True
+        for x0, y0, x1, y1 in dash_segments(start_screen, end_screen, dash_length, gap_length).tolist():
+            pygame.draw.line(screen, dash_color, (x0, y0), (x1, y1), 2)
         
         # Draw arrow at end to indicate direction
         arrow_length = 15
         arrow_width = 8
-        angle = math.atan2(dy, dx)
         
-        # Arrow points
+        # Arrow points; (dx, dy) is already the unit direction and (-dy, dx) its normal
         p1 = (
-            end_screen[0] - arrow_length * math.cos(angle),
-            end_screen[1] - arrow_length * math.sin(angle)
+            end_screen[0] - arrow_length * dx,
+            end_screen[1] - arrow_length * dy
         )
         p2 = (
-            p1[0] - arrow_width * math.cos(angle + math.pi/2),
-            p1[1] - arrow_width * math.sin(angle + math.pi/2)
+            p1[0] + arrow_width * dy,
+            p1[1] - arrow_width * dx
         )
         p3 = (
-            p1[0] - arrow_width * math.cos(angle - math.pi/2),
-            p1[1] - arrow_width * math.sin(angle - math.pi/2)
+            p1[0] - arrow_width * dy,
+            p1[1] + arrow_width * dx
         )
         
         # Draw arrow
         pygame.draw.polygon(screen, dash_color, [end_screen, p2, p3])
-    
-    def _distance(self, pos1, pos2):
-        """Calculate distance between two points.
-        
-        Args:
-            pos1: First position (x, y)
-            pos2: Second position (x, y)
-            
-        Returns:
-            float: Euclidean distance
-        """
-        return ((pos1[0] - pos2[0])**2 + (pos1[1] - pos2[1])**2)**0.5 
\ No newline at end of file